@@ -1,34 +1,69 @@
-from collections import defaultdict
-from io import BytesIO
-from typing import Dict, List, Optional
-
-from django.http import HttpRequest, HttpResponse
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import (Paragraph, SimpleDocTemplate, Spacer, Table,
-                                TableStyle)
+from typing import Optional, Type, Union
+
+from django.db import IntegrityError, transaction
+from django.db.models import Model
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from rest_framework import status
 from rest_framework.request import Request
 from rest_framework.response import Response
 
 from api import constants
-from api.serializers import SubscribeCreateSerializer, SubscribeSerializer
-from recipes.models import Ingredient, RecipeIngredient, Subscribe
+from api.feed import get_feed_querysets
+from api.jobs import enqueue
+from api.pagination import FeedPagination, LimitPageNumberPagination
+from api.recipe_ingredient_index import recipe_ingredient_index
+from api.serializers import (CustomRecipeSerializer, JobSerializer,
+                             RecipeMatchQuerySerializer, RecipeMatchSerializer,
+                             SubscribeCreateSerializer, SubscribeSerializer)
+from api.shopping_list import (get_pdf_response, get_shopping_list, iter_csv,
+                               iter_text)
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscribe
+
+
+def _toggle_user_recipe(
+        request: Request,
+        pk: Optional[int],
+        model: Type[Model],
+        exists_message: str,
+        missing_message: str
+) -> Response:
+    """Добавляет или удаляет связь пользователя с рецептом
+    одним INSERT или DELETE без чтения строки рецепта на запись."""
+    recipe = get_object_or_404(Recipe, pk=pk)
+    if request.method == 'POST':
+        try:
+            with transaction.atomic():
+                model.objects.create(user=request.user, recipe=recipe)
+        except IntegrityError:
+            return Response(
+                {'detail': exists_message},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = CustomRecipeSerializer(
+            recipe,
+            context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    deleted, _ = model.objects.filter(
+        user=request.user, recipe=recipe
+    ).delete()
+    if not deleted:
+        return Response(
+            {'detail': missing_message},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 def favorite(self, request: Request, pk: Optional[int] = None) -> Response:
     """Добавление рецепта в избранное или его удаление из избранного."""
-    recipe = self.get_object()
-    field_name: str = 'is_favorited'
-    error_message: str = (
-        'Рецепт уже находится в избранном!' if getattr(recipe, field_name)
-        else 'Рецепт не находится в избранном!')
-    return self._update_and_response(request, recipe,
-                                     field_name, error_message)
+    return _toggle_user_recipe(
+        request, pk, Favorite,
+        'Рецепт уже находится в избранном!',
+        'Рецепт не находится в избранном!'
+    )
 
 
 def shopping_cart(
@@ -37,106 +72,112 @@ def shopping_cart(
         pk: Optional[int] = None
 ) -> Response:
     """Добавление рецепта в список покупок или его удаление оттуда."""
-    recipe = self.get_object()
-    field_name: str = 'is_in_shopping_cart'
-    error_message: str = (
-        'Рецепт уже находится в списке покупок!' if getattr(recipe, field_name)
-        else 'Рецепт не находится в списке покупок!')
-    return self._update_and_response(
-        request, recipe, field_name, error_message
+    return _toggle_user_recipe(
+        request, pk, ShoppingCart,
+        'Рецепт уже находится в списке покупок!',
+        'Рецепт не находится в списке покупок!'
     )
 
 
-def download_shopping_cart(self, request: HttpRequest) -> HttpResponse:
-    """Скачивание списка покупок в PDF формате"""
-    recipes_in_shopping_cart = RecipeIngredient.objects.filter(
-        recipe__is_in_shopping_cart=True
+def download_shopping_cart(
+        self,
+        request: HttpRequest
+) -> Union[HttpResponse, StreamingHttpResponse]:
+    """Скачивание списка покупок в формате txt, csv или pdf.
+
+    POST ставит рендер PDF в очередь фоновых задач и сразу отвечает
+    202 с задачей, готовый файл скачивается по ее download_url.
+    """
+    if request.method == 'POST':
+        return enqueue_shopping_list(request)
+    file_format = request.query_params.get(
+        'format', constants.SHOPPING_LIST_DEFAULT_FORMAT
     )
+    if file_format not in constants.SHOPPING_LIST_FORMATS:
+        return Response(
+            {'detail': 'Неподдерживаемый формат списка покупок.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    items = get_shopping_list(request.user)
+    if file_format == 'pdf':
+        response = get_pdf_response(list(items))
+    else:
+        iter_content = iter_csv if file_format == 'csv' else iter_text
+        response = StreamingHttpResponse(
+            iter_content(items.iterator()),
+            content_type=constants.SHOPPING_LIST_FORMATS[file_format]
+        )
+    response['Content-Disposition'] = (
+        f'attachment;filename="shopping_list.{file_format}"'
+    )
+    return response
 
-    buffer = BytesIO()
-    pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
-    pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', 'DejaVuSans-Bold.ttf'))
 
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(
-        name='RussianStyle', fontName='DejaVuSans',
-        fontSize=constants.FONTSIZE_12, alignment=TA_LEFT,
-        spaceAfter=constants.SPACE, spaceBefore=constants.SPACE)
+def enqueue_shopping_list(request: Request) -> Response:
+    """Ставит PDF списка покупок в очередь и отдает задачу со ссылкой
+    на нее в заголовке Location."""
+    job = enqueue(constants.JOB_SHOPPING_LIST_PDF, user_id=request.user.pk)
+    return Response(
+        JobSerializer(job, context={'request': request}).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': request.build_absolute_uri(
+            reverse('api:jobs-detail', args=(job.pk,))
+        )}
     )
 
-    ingredient_totals: Dict[str, int] = defaultdict(int)
-    for recipe in recipes_in_shopping_cart:
-        name = recipe.ingredient.name
-        amount = recipe.amount
-        ingredient_totals[name] += amount
-    data: List[List[Paragraph]] = []
-
-    unique_ingredient_names = list(ingredient_totals.keys())
-    ingredients = Ingredient.objects.filter(name__in=unique_ingredient_names)
-    ingredient_units = {
-        ingredient.name: ingredient.measurement_unit
-        for ingredient in ingredients
-    }
 
-    for name, total_amount in ingredient_totals.items():
-        measurement_unit = ingredient_units[name]
-        data.append(
-            [Paragraph(
-                f"• {name.strip()} - {total_amount}{measurement_unit.strip()}",
-                styles['RussianStyle'])]
-        )
-    if not data:
-        data.append(
-            [Paragraph("СПИСОК ПОКУПОК ПУСТ.", styles['RussianStyle'])]
-        )
-    row_height = constants.ROW_HEIGHT
-    num_rows = len(data)
-    rowHeights = [row_height] * num_rows
-
-    table = Table(data, colWidths=500, rowHeights=rowHeights)
-    style = TableStyle([
-        ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
-        ('ALIGN', (0, 0), (-1, 0), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'DejaVuSans'),
-        ('TOPPADDING', (0, 0), (-1, 0), constants.TOPPADDING),
-        ('LINEABOVE', (0, 0), (-1, 0), constants.LINEABOVE, colors.green),
-    ])
-    table.setStyle(style)
-    doc = SimpleDocTemplate(buffer, pagesize=letter, bottomMargin=30)
-    story: List[Paragraph | Spacer | Table] = []
-    header_style = ParagraphStyle(
-        name='HeaderStyle', fontName='DejaVuSans-Bold', fontSize=16,
-        alignment=TA_CENTER, textColor=colors.black,
-        spaceAfter=constants.SPACE, spaceBefore=constants.SPACE
+def feed(self, request: Request) -> Response:
+    """Лента рецептов авторов, на которых подписан пользователь."""
+    paginator = FeedPagination()
+    page = paginator.paginate_queryset(
+        get_feed_querysets(self.get_queryset(), request.user), request, self
     )
-    header_text = "СПИСОК ПОКУПОК"
-    header_paragraph = Paragraph(header_text, header_style)
-    story.append(header_paragraph)
-    story.append(Spacer(constants.SPACER_1, constants.SPACER_20))
-    story.append(table)
-    footer_style = ParagraphStyle(
-        name='FooterStyle', fontName='DejaVuSans', fontSize=14,
-        alignment=TA_CENTER, textColor=colors.black, )
-    footer_text = "<i>Приятного аппетита!</i>"
-    footer_paragraph = Paragraph(footer_text, footer_style)
-    story.append(Spacer(constants.SPACER_1, constants.SPACER_20))
-    story.append(footer_paragraph)
-    doc.build(story)
-    buffer.seek(constants.SEEK)
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment;filename="shopping_list.pdf"'
-    return response
+    serializer = self.get_serializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+def cook(self, request: Request) -> Response:
+    """Рецепты, которые можно приготовить из имеющихся ингредиентов.
+
+    Рецепты подбираются по индексу в памяти, из базы читается
+    только текущая страница.
+    """
+    query = RecipeMatchQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    matches = recipe_ingredient_index.search(
+        query.validated_data['ingredients'],
+        query.validated_data['missing']
+    )
+    paginator = LimitPageNumberPagination()
+    page = paginator.paginate_queryset(matches, request, self)
+    recipes = self.get_queryset().in_bulk(
+        [recipe_id for recipe_id, _, _ in page]
+    )
+    result = []
+    for recipe_id, matched, missing in page:
+        # Рецепт могли удалить в другом воркере до перестроения индекса.
+        recipe = recipes.get(recipe_id)
+        if recipe is not None:
+            recipe.matched_ingredients = matched
+            recipe.missing_ingredients = missing
+            result.append(recipe)
+    serializer = RecipeMatchSerializer(
+        result, many=True, context=self.get_serializer_context()
+    )
+    return paginator.get_paginated_response(serializer.data)
 
 
 def subscriptions(self, request: Request) -> Response:
     """Узнать на кого подписан пользователь"""
-    subscriptions = self.get_queryset().select_related('following')
+    subscriptions = self.paginate_queryset(
+        self.filter_queryset(self.get_queryset())
+    )
     serializer = SubscribeSerializer(
         subscriptions,
         many=True,
         context={'request': request}
     )
-    return Response(serializer.data)
+    return self.get_paginated_response(serializer.data)
 
 
 def subscribe(self, request: Request, pk: Optional[int] = None) -> Response:
@@ -149,16 +190,17 @@ def subscribe(self, request: Request, pk: Optional[int] = None) -> Response:
     if request.method == 'POST':
         serializer = SubscribeCreateSerializer(
             data=data,
+            context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
-    try:
-        subscriptions = self.get_queryset().get(following=pk)
-    except Subscribe.DoesNotExist:
+    deleted, _ = Subscribe.objects.filter(
+        user=request.user, following=pk
+    ).delete()
+    if not deleted:
         return Response(
             {'detail': 'Подписка не найдена.'},
             status=status.HTTP_404_NOT_FOUND
         )
-    subscriptions.delete()
     return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from typing import Callable, Iterable, List, Union
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpRequest, HttpResponse
+from django.urls import URLPattern, URLResolver
+from rest_framework.permissions import SAFE_METHODS
+
+from api.middleware import record_queries
+
+# В Django 3.2 нет асинхронного ORM, а DRF не умеет асинхронные view,
+# поэтому чтение выполняется синхронно, но в отдельном пуле потоков.
+# Размер пула ограничивает и число соединений с базой на процесс.
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_READ_THREADS,
+    thread_name_prefix='async-read'
+)
+
+
+def run_view(
+        view: Callable,
+        request: HttpRequest,
+        *args,
+        **kwargs
+) -> HttpResponse:
+    """Выполняет view, записывая запросы в метрики, и рендерит ответ
+    в том же потоке, где открыто соединение с базой.
+
+    Django 3.2 под ASGI перебирает потоковый ответ в цикле событий,
+    где обращаться к базе нельзя, поэтому такой ответ собирается здесь.
+    """
+    with record_queries(getattr(request, 'performance_metrics', None)):
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        if response.streaming:
+            response.streaming_content = list(response.streaming_content)
+    return response
+
+
+def run_in_pool(
+        view: Callable,
+        request: HttpRequest,
+        *args,
+        **kwargs
+) -> HttpResponse:
+    """Выполняет view в потоке пула.
+
+    Соединения потоков пула живут до CONN_MAX_AGE и проверяются
+    так же, как соединения воркера в начале и конце запроса.
+    """
+    close_old_connections()
+    try:
+        return run_view(view, request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def async_view(view: Callable, offload_reads: bool) -> Callable:
+    """Асинхронная обертка над синхронным view.
+
+    С offload_reads запросы GET и HEAD выполняются в пуле потоков
+    параллельно и не занимают общий поток синхронного кода, в котором
+    Django под ASGI выполняет все синхронные view. Остальные запросы,
+    в том числе все записи, идут в этот общий поток, как и без обертки.
+    """
+    read = sync_to_async(
+        partial(run_in_pool, view),
+        thread_sensitive=False,
+        executor=executor
+    )
+    default = sync_to_async(partial(run_view, view), thread_sensitive=True)
+
+    @wraps(view)
+    async def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        if offload_reads and request.method in SAFE_METHODS:
+            return await read(request, *args, **kwargs)
+        return await default(request, *args, **kwargs)
+
+    return wrapper
+
+
+def make_async_views(
+        urlpatterns: Iterable[Union[URLPattern, URLResolver]],
+        read_routes: Iterable[str]
+) -> List[Union[URLPattern, URLResolver]]:
+    """Делает view маршрутов асинхронными, чтение маршрутов
+    с именами из read_routes уходит в пул потоков."""
+    read_routes = set(read_routes)
+    for pattern in urlpatterns:
+        if isinstance(pattern, URLResolver):
+            make_async_views(pattern.url_patterns, read_routes)
+        else:
+            pattern.callback = async_view(
+                pattern.callback, pattern.name in read_routes
+            )
+    return list(urlpatterns)
@@ -0,0 +1,53 @@
+from threading import local
+from typing import Callable, Iterable, Optional, Set
+from weakref import ref
+
+from django.db import transaction
+
+
+class _Batch:
+    """Id, накопленные в одной транзакции."""
+
+    def __init__(self, owner: 'OnCommitBatch') -> None:
+        self.owner = owner
+        self.ids: Set[int] = set()
+
+    def flush(self) -> None:
+        self.owner._local.batch = None
+        ids, self.ids = self.ids, set()
+        if ids:
+            self.owner.handler(ids)
+
+
+class OnCommitBatch:
+    """Копит id в пределах транзакции и после ее фиксации
+    передает их обработчику одним вызовом.
+
+    На транзакцию заводится одна партия, и ее сброс регистрируется
+    через on_commit при первом add. Сильная ссылка на партию есть
+    только у этого on_commit, в потоке хранится слабая: при откате
+    транзакции Django отбрасывает on_commit, партия удаляется,
+    и следующая транзакция начинает новую. Если on_commit зарегистрирован
+    во вложенном atomic, его откат отбрасывает всю партию, а откат
+    вложенного atomic после регистрации оставляет в ней его id -
+    поэтому обработчик должен перечитывать состояние из базы.
+    """
+
+    def __init__(self, handler: Callable[[Set[int]], None]) -> None:
+        self.handler = handler
+        self._local = local()
+
+    def add(self, ids: Iterable[int]) -> None:
+        batch = self._get_batch()
+        if batch is not None:
+            batch.ids.update(ids)
+            return
+        batch = _Batch(self)
+        batch.ids.update(ids)
+        self._local.batch = ref(batch)
+        # Вне транзакции on_commit выполняет сброс сразу.
+        transaction.on_commit(batch.flush)
+
+    def _get_batch(self) -> Optional[_Batch]:
+        batch = getattr(self._local, 'batch', None)
+        return batch() if batch is not None else None
@@ -0,0 +1,57 @@
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+
+registry: Dict[str, 'CountingCache'] = {}
+
+
+class CountingCache:
+    """Обертка над кэшем Django со счетчиками попаданий и промахов.
+
+    Хранилище, его размер и политика вытеснения задаются в CACHES,
+    счетчики считаются в пределах процесса (воркера).
+    """
+
+    def __init__(self, name: str, alias: str) -> None:
+        self.name = name
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        registry[name] = self
+
+    @property
+    def backend(self) -> BaseCache:
+        return caches[self.alias]
+
+    def get(
+            self,
+            key: str,
+            is_valid: Optional[Callable[[Any], bool]] = None
+    ) -> Optional[Any]:
+        """Значение по ключу; значение, не прошедшее is_valid,
+        считается промахом."""
+        value = self.backend.get(key)
+        if value is not None and is_valid is not None and not is_valid(value):
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.backend.set(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики и долю попаданий."""
+        total = self.hits + self.misses
+        return {
+            'alias': self.alias,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+        }
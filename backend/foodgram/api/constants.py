@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Tuple
 
 USER_EMAIL_MAX_LENGTH: int = 254
 USER_NAME_MAX_LENGTH: int = 150
@@ -17,3 +17,54 @@ TOPPADDING: int = 6
 LINEABOVE: int = 2
 NUMBER_MAX: int = 32000
 NUMBER_MIN: int = 1
+SHOPPING_LIST_FORMATS: Dict[str, str] = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'pdf': 'application/pdf',
+}
+SHOPPING_LIST_DEFAULT_FORMAT: str = 'pdf'
+SHOPPING_LIST_PDF_CACHE_PREFIX: str = 'shopping_list_pdf:v1'
+INGREDIENT_SEARCH_LIMIT: int = 50
+BASE64_DECODE_CHUNK_SIZE: int = 64 * 1024
+TAGS_MODE_ALL: str = 'all'
+KEYSET_PAGINATION_MODE: str = 'cursor'
+KEYSET_MAX_PAGE_SIZE: int = 100
+REFERENCE_CACHE_PREFIX: str = 'reference:v1'
+REFERENCE_TAGS: str = 'tags'
+REFERENCE_INGREDIENTS: str = 'ingredients'
+RECIPE_CACHE_PREFIX: str = 'recipe:v2'
+RECIPE_AUTHOR_FIELDS: frozenset = frozenset(
+    ('email', 'username', 'first_name', 'last_name', 'is_subscribed')
+)
+RECIPE_SEARCH_CONFIG: str = 'russian'
+RECIPE_SEARCH_TERMS: int = 10
+RECIPE_SEARCH_BATCH_SIZE: int = 1000
+RECIPE_SEARCH_ORDERING: Tuple[str, ...] = ('-search_rank', '-pub_date', 'id')
+FEED_ORDERING: Tuple[str, ...] = ('-feed_pub_date', '-feed_recipe_id')
+FEED_BACKFILL_LIMIT: int = 100
+FEED_CACHE_PREFIX: str = 'feed:v1'
+RECIPE_INDEX_DENSE_RATIO: int = 32
+COOK_MAX_INGREDIENTS: int = 50
+COOK_MAX_MISSING: int = 5
+RECIPE_COUNTER_FIELDS: frozenset = frozenset(('favorites_count',))
+USER_COUNTER_FIELDS: frozenset = frozenset(
+    ('recipes_count', 'followers_count', 'following_count')
+)
+COUNTERS_BATCH_SIZE: int = 1000
+ADMIN_EXACT_COUNT_LIMIT: int = 100000
+ASYNC_READ_ROUTES: Tuple[str, ...] = (
+    'recipes-list', 'recipes-detail', 'tags-list', 'tags-detail',
+    'ingredients-list', 'ingredients-detail', 'subscriptions-list',
+    'jobs-detail',
+)
+JOB_SHOPPING_LIST_PDF: str = 'shopping_list_pdf'
+JOB_RECIPE_IMAGE: str = 'recipe_image'
+JOB_DELETE_IMAGE: str = 'delete_image'
+JOB_INGREDIENT_SEARCH: str = 'ingredient_search'
+JOB_FEED_BACKFILL: str = 'feed_backfill'
+JOB_MAX_ATTEMPTS: int = 3
+JOB_RETRY_DELAY: int = 30
+JOB_PURGE_INTERVAL: int = 60
+JOB_PURGE_BATCH_SIZE: int = 100
+RECIPE_IMAGE_FORMATS: frozenset = frozenset(('JPEG', 'PNG', 'WEBP'))
+RECIPE_IMAGE_DELETE_DELAY: int = 60 * 60
@@ -0,0 +1,86 @@
+from typing import Dict, NamedTuple, Type
+
+from django.db.models import Count, F, Model, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api import constants
+from recipes.models import Favorite, Recipe, Subscribe
+from users.models import User
+
+
+class Counter(NamedTuple):
+    """Поле field модели model считает строки source,
+    ссылающиеся на нее через внешний ключ relation."""
+    model: Type[Model]
+    field: str
+    source: Type[Model]
+    relation: str
+
+
+COUNTERS = (
+    Counter(Recipe, 'favorites_count', Favorite, 'recipe'),
+    Counter(User, 'recipes_count', Recipe, 'author'),
+    Counter(User, 'followers_count', Subscribe, 'following'),
+    Counter(User, 'following_count', Subscribe, 'user'),
+)
+
+
+def change_counters(instance: Model, delta: int) -> None:
+    """Сдвигает на delta счетчики, которые считают строку instance.
+
+    Вызывается в транзакции самой записи. UPDATE ... SET field =
+    field + delta не теряет параллельные изменения и не требует
+    чтения строки.
+    """
+    for counter in COUNTERS:
+        if not isinstance(instance, counter.source):
+            continue
+        queryset = counter.model.objects.filter(
+            pk=getattr(instance, f'{counter.relation}_id')
+        )
+        if delta < 0:
+            # Разошедшийся счетчик не уходит в минус.
+            queryset = queryset.filter(**{f'{counter.field}__gte': -delta})
+        queryset.update(**{counter.field: F(counter.field) + delta})
+
+
+def actual_count(counter: Counter) -> Coalesce:
+    """Подзапрос с фактическим числом строк для счетчика."""
+    return Coalesce(
+        Subquery(
+            counter.source.objects.filter(
+                **{counter.relation: OuterRef('pk')}
+            ).order_by().values(counter.relation).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+def reconcile_counters(
+        batch_size: int = constants.COUNTERS_BATCH_SIZE
+) -> Dict[str, int]:
+    """Пересчитывает разошедшиеся счетчики.
+
+    Значение пересчитывается в самом UPDATE, поэтому изменения,
+    сделанные между поиском и исправлением, не теряются. Возвращает
+    число исправленных строк для каждого счетчика.
+    """
+    fixed = {}
+    for counter in COUNTERS:
+        drifted = list(
+            counter.model.objects.annotate(
+                actual=actual_count(counter)
+            ).exclude(
+                **{counter.field: F('actual')}
+            ).order_by().values_list('pk', flat=True).iterator()
+        )
+        for start in range(0, len(drifted), batch_size):
+            counter.model.objects.filter(
+                pk__in=drifted[start:start + batch_size]
+            ).update(**{counter.field: actual_count(counter)})
+        fixed[f'{counter.model._meta.model_name}.{counter.field}'] = len(
+            drifted
+        )
+    return fixed
@@ -0,0 +1,194 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, QuerySet
+
+from api import constants
+from api.reference_cache import reference_cache
+from recipes.models import FeedEntry, Recipe, Subscribe
+from users.models import User
+
+PULL_AUTHORS_KEY = f'{constants.FEED_CACHE_PREFIX}:pull_authors'
+BATCH_SIZE = 1000
+
+
+def count_followers(author_id: int) -> int:
+    """Число подписчиков автора, но не больше порога раскладки + 1."""
+    limit = settings.FEED_FANOUT_MAX_FOLLOWERS + 1
+    return Subscribe.objects.filter(
+        following_id=author_id
+    ).order_by()[:limit].count()
+
+
+def get_pull_authors() -> Set[int]:
+    """Авторы, чьи рецепты лента читает из рецептов, а не из записей.
+
+    Таких авторов мало по определению, поэтому их множество целиком
+    хранится в кэше и сбрасывается, когда автор пересекает порог.
+    """
+    authors = reference_cache.get(PULL_AUTHORS_KEY)
+    if authors is None:
+        authors = set(
+            Subscribe.objects.order_by().values('following').annotate(
+                followers=Count('id')
+            ).filter(
+                followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+            ).values_list('following', flat=True)
+        )
+        reference_cache.set(PULL_AUTHORS_KEY, authors)
+    return authors
+
+
+def invalidate_pull_authors() -> None:
+    transaction.on_commit(
+        lambda: reference_cache.backend.delete(PULL_AUTHORS_KEY)
+    )
+
+
+def fan_out_recipe(recipe: Recipe) -> None:
+    """Раскладывает новый рецепт по лентам подписчиков автора."""
+    limit = settings.FEED_FANOUT_MAX_FOLLOWERS
+    followers = list(
+        Subscribe.objects.filter(
+            following_id=recipe.author_id
+        ).order_by().values_list('user_id', flat=True)[:limit + 1]
+    )
+    if len(followers) > limit:
+        return
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe.pk,
+                author_id=recipe.author_id,
+                pub_date=recipe.pub_date,
+            )
+            for user_id in followers
+        ),
+        batch_size=BATCH_SIZE
+    )
+
+
+def backfill_feeds(user_ids: Iterable[int], author_id: int) -> int:
+    """Добавляет в ленты последние рецепты автора.
+
+    Берется не больше FEED_BACKFILL_LIMIT рецептов, поэтому подписка
+    на очень плодовитого автора стоит столько же, сколько на любого.
+    Возвращает число записей, которые пытались вставить.
+    """
+    recipes = list(
+        Recipe.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id'
+        ).values_list('id', 'pub_date')[:constants.FEED_BACKFILL_LIMIT]
+    )
+    if not recipes:
+        return 0
+    return len(FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id in user_ids
+            for recipe_id, pub_date in recipes
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    ))
+
+
+def fill_feeds(user_ids: Iterable[int]) -> int:
+    """Заполняет ленты пользователей по всем их подпискам.
+
+    Нужна, когда подписки записаны в обход сигналов, например
+    через bulk_create при генерации данных.
+    """
+    followers: Dict[int, List[int]] = defaultdict(list)
+    for user_id, author_id in Subscribe.objects.filter(
+            user_id__in=list(user_ids)
+    ).exclude(
+        following__in=get_pull_authors()
+    ).order_by().values_list('user_id', 'following_id'):
+        followers[author_id].append(user_id)
+    return sum(
+        backfill_feeds(user_ids, author_id)
+        for author_id, user_ids in followers.items()
+    )
+
+
+def on_subscribe(user_id: int, author_id: int) -> None:
+    """Заполняет ленту нового подписчика или переводит автора
+    на чтение из рецептов, если подписчиков стало слишком много."""
+    followers = count_followers(author_id)
+    if followers <= settings.FEED_FANOUT_MAX_FOLLOWERS:
+        backfill_feeds([user_id], author_id)
+    elif followers == settings.FEED_FANOUT_MAX_FOLLOWERS + 1:
+        invalidate_pull_authors()
+
+
+def on_unsubscribe(user_id: int, author_id: int) -> bool:
+    """Убирает рецепты автора из ленты отписавшегося.
+
+    Возвращает True, если автор опустился до порога: тогда ленты
+    оставшихся подписчиков нужно дозаполнить через backfill_followers.
+    """
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+    return count_followers(author_id) == settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def backfill_followers(author_id: int) -> None:
+    """Раскладывает последние рецепты автора по лентам всех его
+    подписчиков и возвращает автора к раскладке при публикации.
+
+    Подписчики обрабатываются частями, чтобы за раз вставлялось
+    не больше BATCH_SIZE записей. Если подписчиков снова стало
+    больше порога, автор остается на чтении из рецептов.
+    """
+    if count_followers(author_id) > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        return
+    followers = Subscribe.objects.filter(
+        following_id=author_id
+    ).order_by('user_id').values_list('user_id', flat=True)
+    batch_size = max(BATCH_SIZE // constants.FEED_BACKFILL_LIMIT, 1)
+    last_id = 0
+    while True:
+        user_ids = list(followers.filter(user_id__gt=last_id)[:batch_size])
+        if not user_ids:
+            break
+        backfill_feeds(user_ids, author_id)
+        last_id = user_ids[-1]
+    invalidate_pull_authors()
+
+
+def get_feed_querysets(queryset: QuerySet, user: User) -> List[QuerySet]:
+    """Источники ленты: записи ленты пользователя и, если он подписан
+    на авторов с большим числом подписчиков, их рецепты напрямую.
+
+    Ключ сортировки ленты берется из аннотаций feed_pub_date
+    и feed_recipe_id: для записей ленты это ее собственные колонки,
+    и страница читается прямо по индексу без сортировки.
+    """
+    querysets = [
+        queryset.filter(feed_entries__user=user).annotate(
+            feed_pub_date=F('feed_entries__pub_date'),
+            feed_recipe_id=F('feed_entries__recipe_id')
+        )
+    ]
+    pull_authors = get_pull_authors()
+    if pull_authors:
+        followed = list(
+            Subscribe.objects.filter(
+                user=user, following__in=pull_authors
+            ).order_by().values_list('following', flat=True)
+        )
+        if followed:
+            querysets.append(
+                queryset.filter(author__in=followed).annotate(
+                    feed_pub_date=F('pub_date'), feed_recipe_id=F('id')
+                )
+            )
+    return querysets
@@ -1,15 +1,18 @@
-from typing import Tuple
+from typing import List, Optional, Tuple, Type
 
+from django.db.models import Exists, Model, OuterRef, QuerySet
 from django_filters import CharFilter, FilterSet
 from django_filters.rest_framework import BooleanFilter
 
-from recipes.models import Ingredient, Recipe
+from api import constants
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeTag,
+                            ShoppingCart)
 
 
 class RecipeFilter(FilterSet):
     """Фильтрация по избранному, автору и списку покупок."""
-    is_favorited = BooleanFilter(field_name="is_favorited")
-    is_in_shopping_cart = BooleanFilter(field_name="is_in_shopping_cart")
+    is_favorited = BooleanFilter(method='filter_is_favorited')
+    is_in_shopping_cart = BooleanFilter(method='filter_is_in_shopping_cart')
     author = CharFilter(field_name='author__id')
 
     class Meta:
@@ -20,6 +23,57 @@ class RecipeFilter(FilterSet):
             'is_in_shopping_cart',
         )
 
+    def _filter_user_recipe(
+            self,
+            queryset: QuerySet,
+            model: Type[Model],
+            value: bool
+    ) -> QuerySet:
+        """Фильтрует рецепты по связи с текущим пользователем."""
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none() if value else queryset
+        in_relation = Exists(
+            model.objects.filter(user=user, recipe=OuterRef('pk'))
+        )
+        return queryset.filter(in_relation if value else ~in_relation)
+
+    def filter_is_favorited(
+            self,
+            queryset: QuerySet,
+            name: str,
+            value: bool
+    ) -> QuerySet:
+        return self._filter_user_recipe(queryset, Favorite, value)
+
+    def filter_is_in_shopping_cart(
+            self,
+            queryset: QuerySet,
+            name: str,
+            value: bool
+    ) -> QuerySet:
+        return self._filter_user_recipe(queryset, ShoppingCart, value)
+
+
+def filter_by_tags(
+        queryset: QuerySet,
+        slugs: List[str],
+        mode: Optional[str] = None
+) -> QuerySet:
+    """Фильтрует рецепты по тегам подзапросами EXISTS без DISTINCT.
+
+    По умолчанию рецепту достаточно одного из тегов,
+    в режиме all у него должны быть все переданные теги.
+    """
+    recipe_tags = RecipeTag.objects.filter(recipe=OuterRef('pk'))
+    if mode == constants.TAGS_MODE_ALL:
+        for slug in set(slugs):
+            queryset = queryset.filter(
+                Exists(recipe_tags.filter(tag__slug=slug))
+            )
+        return queryset
+    return queryset.filter(Exists(recipe_tags.filter(tag__slug__in=slugs)))
+
 
 class IngredientFilter(FilterSet):
     """Фильтрация по имени ингредиента."""
@@ -0,0 +1,83 @@
+import logging
+import time
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from api import constants
+from recipes.models import Ingredient
+
+logger = logging.getLogger(__name__)
+
+
+class IngredientIndex:
+    """Отсортированный префиксный индекс ингредиентов в памяти процесса.
+
+    Индекс строится целиком из таблицы ингредиентов, сбрасывается
+    сигналами при изменении Ingredient и перестраивается не реже чем
+    раз в INGREDIENT_INDEX_TTL секунд, чтобы изменения, сделанные
+    в других воркерах, тоже доходили до поиска.
+    """
+
+    def __init__(self) -> None:
+        self._index: Tuple[List[str], List[Dict]] = ([], [])
+        self._built_at: Optional[float] = None
+        self._lock = Lock()
+
+    def build(self) -> None:
+        """Загружает ингредиенты из базы и заменяет индекс целиком."""
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].lower(), row['id'])
+        )
+        keys = [row['name'].lower() for row in rows]
+        with self._lock:
+            self._index = (keys, rows)
+            self._built_at = time.monotonic()
+
+    def warm_up(self) -> None:
+        """Строит индекс при старте, не падая без готовой базы."""
+        try:
+            self.build()
+        except DatabaseError:
+            logger.warning('Ingredient index warm-up skipped', exc_info=True)
+
+    def invalidate(self) -> None:
+        """Помечает индекс устаревшим, он перестроится при поиске."""
+        self._built_at = None
+
+    def _snapshot(self) -> Tuple[List[str], List[Dict]]:
+        built_at = self._built_at
+        ttl = settings.INGREDIENT_INDEX_TTL
+        if built_at is None or time.monotonic() - built_at > ttl:
+            self.build()
+        return self._index
+
+    def search(
+            self,
+            query: str,
+            limit: int = constants.INGREDIENT_SEARCH_LIMIT
+    ) -> List[Dict]:
+        """Ищет ингредиенты: сначала по началу названия, затем
+        по вхождению подстроки, не более limit результатов."""
+        query = query.strip().lower()
+        keys, rows = self._snapshot()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and end - start < limit and (
+                keys[end].startswith(query)):
+            end += 1
+        result = rows[start:end]
+        if len(result) < limit:
+            for key, row in zip(keys, rows):
+                if query in key and not key.startswith(query):
+                    result.append(row)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
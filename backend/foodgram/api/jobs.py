@@ -0,0 +1,235 @@
+import logging
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
+
+from api import constants
+from api.feed import backfill_followers
+from api.recipe_cache import invalidate_recipes
+from api.search import update_search_documents
+from api.shopping_list import get_shopping_list, render_pdf
+from api.uploads import shrink_image
+from recipes.models import Job, Recipe, RecipeIngredient
+
+logger = logging.getLogger(__name__)
+
+
+class Artifact(NamedTuple):
+    """Файл, который задача отдает клиенту."""
+    content: bytes
+    content_type: str
+    filename: str
+
+
+Handler = Callable[[Job], Optional[Artifact]]
+HANDLERS: Dict[str, Handler] = {}
+
+
+def handler(kind: str) -> Callable[[Handler], Handler]:
+    """Регистрирует обработчик задач типа kind."""
+    def register(func: Handler) -> Handler:
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(
+        kind: str,
+        user_id: Optional[int] = None,
+        delay: int = 0,
+        **payload
+) -> Job:
+    """Ставит задачу в очередь, выполнить не раньше чем через delay секунд.
+
+    Задача пишется в текущей транзакции: если она откатится,
+    задачи не будет, а воркер не увидит ее до фиксации.
+    """
+    return Job.objects.create(
+        kind=kind,
+        user_id=user_id,
+        payload=payload,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def get_claimable(now: datetime) -> QuerySet:
+    """Задачи, которые пора выполнить, и брошенные упавшими воркерами."""
+    stale = now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    return Job.objects.filter(
+        Q(status=Job.Status.PENDING, run_after__lte=now)
+        | Q(status=Job.Status.RUNNING, locked_at__lt=stale)
+    )
+
+
+def claim_jobs(limit: int) -> List[int]:
+    """Забирает до limit задач из очереди и возвращает их id.
+
+    В PostgreSQL строки, которые уже забирает другой воркер,
+    пропускаются через SKIP LOCKED. Каждая задача переводится
+    в работу условным UPDATE, поэтому и в SQLite, где блокировок
+    строк нет, одну задачу не заберут два воркера.
+    """
+    now = timezone.now()
+    queryset = get_claimable(now).order_by('run_after', 'id')
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    with transaction.atomic() if skip_locked else nullcontext():
+        if skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        job_ids = list(queryset.values_list('id', flat=True)[:limit])
+        return [
+            job_id for job_id in job_ids
+            if get_claimable(now).filter(pk=job_id).update(
+                status=Job.Status.RUNNING,
+                locked_at=now,
+                attempts=F('attempts') + 1,
+            )
+        ]
+
+
+def run_job(job_id: int) -> str:
+    """Выполняет взятую в работу задачу и возвращает ее новый статус.
+
+    При ошибке задача возвращается в очередь с задержкой
+    JOB_RETRY_DELAY, удваивающейся с каждой попыткой, а после
+    последней попытки помечается упавшей.
+    """
+    job = Job.objects.select_related('user').get(pk=job_id)
+    try:
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('Превышено число попыток.')
+        artifact = HANDLERS[job.kind](job)
+    except Exception as error:
+        logger.exception('Job %s (%s) failed', job.pk, job.kind)
+        job.error = f'{type(error).__name__}: {error}'
+        if job.attempts < job.max_attempts:
+            job.status = Job.Status.PENDING
+            job.run_after = timezone.now() + timedelta(
+                seconds=constants.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            )
+        else:
+            job.status = Job.Status.FAILED
+    else:
+        if artifact is not None:
+            job.result.save(
+                f'{job.pk}_{artifact.filename}',
+                ContentFile(artifact.content),
+                save=False
+            )
+            job.content_type = artifact.content_type
+            job.filename = artifact.filename
+        job.status = Job.Status.DONE
+        job.error = ''
+    job.locked_at = None
+    job.save()
+    return job.status
+
+
+def purge_jobs(batch_size: int = constants.JOB_PURGE_BATCH_SIZE) -> int:
+    """Удаляет завершенные задачи старше JOBS_RESULT_TTL вместе
+    с файлами результатов, не больше batch_size за вызов."""
+    expired = timezone.now() - timedelta(seconds=settings.JOBS_RESULT_TTL)
+    jobs = list(Job.objects.filter(
+        status__in=(Job.Status.DONE, Job.Status.FAILED),
+        updated__lt=expired,
+    ).order_by('id')[:batch_size])
+    for job in jobs:
+        if job.result:
+            job.result.delete(save=False)
+    Job.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+    return len(jobs)
+
+
+@handler(constants.JOB_SHOPPING_LIST_PDF)
+def shopping_list_pdf(job: Job) -> Artifact:
+    """PDF списка покупок пользователя на момент выполнения задачи."""
+    content, _ = render_pdf(list(get_shopping_list(job.user)))
+    return Artifact(
+        content,
+        constants.SHOPPING_LIST_FORMATS['pdf'],
+        'shopping_list.pdf'
+    )
+
+
+@handler(constants.JOB_RECIPE_IMAGE)
+def recipe_image(job: Job) -> None:
+    """Уменьшает слишком большую картинку рецепта.
+
+    Новый файл подменяет старый, только если картинку рецепта
+    не заменили, пока шла обработка. Вместе с картинкой меняется
+    Recipe.updated, и веб-воркеры перестают отдавать представление
+    рецепта со старой ссылкой. Старый файл удаляется отдельной
+    задачей через RECIPE_IMAGE_DELETE_DELAY: до тех пор ссылка
+    на него может оставаться у клиентов.
+    """
+    recipe = Recipe.objects.filter(pk=job.payload['recipe_id']).first()
+    if recipe is None or not recipe.image:
+        return None
+    storage = recipe.image.storage
+    old_name = recipe.image.name
+    with storage.open(old_name, 'rb') as file:
+        content = shrink_image(file, settings.RECIPE_IMAGE_MAX_DIMENSION)
+    if content is None:
+        return None
+    new_name = storage.save(old_name, ContentFile(content))
+    with transaction.atomic():
+        if not Recipe.objects.filter(pk=recipe.pk, image=old_name).update(
+                image=new_name, updated=timezone.now()):
+            storage.delete(new_name)
+            return None
+        invalidate_recipes([recipe.pk])
+        enqueue(
+            constants.JOB_DELETE_IMAGE,
+            delay=constants.RECIPE_IMAGE_DELETE_DELAY,
+            name=old_name
+        )
+    return None
+
+
+@handler(constants.JOB_DELETE_IMAGE)
+def delete_image(job: Job) -> None:
+    """Удаляет замененную картинку, если на нее не ссылаются рецепты."""
+    name = job.payload['name']
+    if not Recipe.objects.filter(image=name).exists():
+        Recipe._meta.get_field('image').storage.delete(name)
+    return None
+
+
+@handler(constants.JOB_INGREDIENT_SEARCH)
+def ingredient_search(job: Job) -> None:
+    """Пересобирает поисковые документы рецептов с переименованным
+    ингредиентом, по RECIPE_SEARCH_BATCH_SIZE рецептов за раз."""
+    recipe_ids = RecipeIngredient.objects.filter(
+        ingredient_id=job.payload['ingredient_id']
+    ).order_by('recipe_id').values_list('recipe_id', flat=True)
+    last_id = 0
+    while True:
+        batch = list(recipe_ids.filter(recipe_id__gt=last_id)[
+            :constants.RECIPE_SEARCH_BATCH_SIZE
+        ])
+        if not batch:
+            return None
+        update_search_documents(batch)
+        last_id = batch[-1]
+
+
+@handler(constants.JOB_FEED_BACKFILL)
+def feed_backfill(job: Job) -> None:
+    """Дозаполняет ленты подписчиков автора, опустившегося до порога
+    раскладки."""
+    backfill_followers(job.payload['author_id'])
+    return None
+
+
+def schedule_recipe_image(recipe: Recipe) -> None:
+    """Ставит в очередь обработку новой картинки рецепта."""
+    if settings.RECIPE_IMAGE_MAX_DIMENSION:
+        enqueue(
+            constants.JOB_RECIPE_IMAGE, user_id=recipe.author_id,
+            recipe_id=recipe.pk
+        )
@@ -0,0 +1,216 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+logger = logging.getLogger('foodgram.performance')
+
+PLACEHOLDERS = re.compile(r'%s(?:\s*,\s*%s)+')
+
+
+class QueryRecorder:
+    """Собирает число, время и формы SQL-запросов одного HTTP-запроса."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[PLACEHOLDERS.sub('%s, ...', sql)] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Одинаковые по форме запросы, повторенные не меньше threshold
+        раз: вероятный N+1."""
+        return [
+            (shape, count) for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
+class RequestMetrics:
+    """Метрики одного выбранного для замера запроса."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.queries = QueryRecorder()
+        self.view: Optional[str] = None
+        self.view_started: Optional[Tuple[float, float]] = None
+        self.serialize: Optional[float] = None
+
+    def view_start(self) -> None:
+        self.view_started = (time.perf_counter(), self.queries.duration)
+
+    def view_end(self) -> None:
+        """Время view без SQL: в DRF это в основном сериализация."""
+        if self.view_started is None:
+            return
+        started, sql_before = self.view_started
+        sql = self.queries.duration - sql_before
+        self.serialize = time.perf_counter() - started - sql
+
+
+@contextmanager
+def record_queries(metrics: Optional[RequestMetrics]) -> Iterator[None]:
+    """Записывает запросы текущего потока в метрики, если они есть.
+
+    Соединения с базой у каждого потока свои, поэтому view,
+    выполняемое в пуле потоков, подключает запись само.
+    """
+    with ExitStack() as stack:
+        if metrics is not None:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(metrics.queries)
+                )
+        yield
+
+
+def get_view_name(view_func: Callable, method: str) -> str:
+    """Имя вида RecipeViewSet.list для вьюсетов DRF."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    action = (getattr(view_func, 'actions', None) or {}).get(method.lower())
+    return f'{view_class.__name__}.{action or method.lower()}'
+
+
+class PerformanceMiddleware:
+    """Замеряет запросы к API: SQL, сериализацию и размер ответа.
+
+    Доля замеряемых запросов задается PERFORMANCE_SAMPLE_RATE,
+    при нуле middleware сразу передает запрос дальше. Результат
+    отдается заголовком Server-Timing и строкой JSON в лог
+    foodgram.performance, повторы одинаковых запросов - как N+1.
+
+    Под ASGI middleware работает асинхронно и не переводит всю
+    цепочку в общий поток синхронного кода.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+        self.sample_rate = settings.PERFORMANCE_SAMPLE_RATE
+        self.threshold = settings.PERFORMANCE_N_PLUS_ONE_THRESHOLD
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.is_sampled(request):
+            return self.get_response(request)
+        metrics = request.performance_metrics = RequestMetrics()
+        with record_queries(metrics):
+            response = self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if not self.is_sampled(request):
+            return await self.get_response(request)
+        metrics = request.performance_metrics = RequestMetrics()
+        with record_queries(metrics):
+            response = await self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    def is_sampled(self, request: HttpRequest) -> bool:
+        return bool(
+            self.sample_rate
+            and request.path.startswith('/api/')
+            and random.random() < self.sample_rate
+        )
+
+    def finish(
+            self,
+            request: HttpRequest,
+            response: HttpResponse,
+            metrics: RequestMetrics
+    ) -> HttpResponse:
+        total = time.perf_counter() - metrics.started
+        response['Server-Timing'] = self.server_timing(metrics, total)
+        self.log(request, response, metrics, total)
+        return response
+
+    def process_view(
+            self,
+            request: HttpRequest,
+            view_func: Callable,
+            view_args,
+            view_kwargs
+    ) -> None:
+        metrics = getattr(request, 'performance_metrics', None)
+        if metrics is not None:
+            metrics.view = get_view_name(view_func, request.method)
+            metrics.view_start()
+
+    def process_template_response(
+            self,
+            request: HttpRequest,
+            response: HttpResponse
+    ) -> HttpResponse:
+        metrics = getattr(request, 'performance_metrics', None)
+        if metrics is not None:
+            metrics.view_end()
+        return response
+
+    @staticmethod
+    def server_timing(metrics: RequestMetrics, total: float) -> str:
+        queries = metrics.queries
+        timings = [
+            f'db;dur={queries.duration * 1000:.2f};'
+            f'desc="{queries.count} queries"'
+        ]
+        if metrics.serialize is not None:
+            timings.append(f'serialize;dur={metrics.serialize * 1000:.2f}')
+        timings.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(timings)
+
+    def log(
+            self,
+            request: HttpRequest,
+            response: HttpResponse,
+            metrics: RequestMetrics,
+            total: float
+    ) -> None:
+        repeated = metrics.queries.repeated(self.threshold)
+        record: Dict = {
+            'method': request.method,
+            'path': request.path,
+            'view': metrics.view,
+            'status': response.status_code,
+            'queries': metrics.queries.count,
+            'sql_ms': round(metrics.queries.duration * 1000, 2),
+            'serialize_ms': (
+                None if metrics.serialize is None
+                else round(metrics.serialize * 1000, 2)
+            ),
+            'total_ms': round(total * 1000, 2),
+            'response_bytes': (
+                None if response.streaming else len(response.content)
+            ),
+            'n_plus_one': [
+                {'sql': shape[:200], 'count': count}
+                for shape, count in repeated
+            ],
+        }
+        logger.log(
+            logging.WARNING if repeated else logging.INFO,
+            json.dumps(record, ensure_ascii=False)
+        )
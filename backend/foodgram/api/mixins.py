@@ -1,9 +1,20 @@
+from typing import Callable
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework import mixins
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.viewsets import GenericViewSet
 
+from api.reference_cache import (get_content_key, get_etag, get_version,
+                                 reference_cache)
+
 
 class ListRetrieve(mixins.CreateModelMixin,
                    mixins.ListModelMixin,
+                   mixins.RetrieveModelMixin,
                    mixins.DestroyModelMixin,
                    GenericViewSet):
     """Класс, включающий в себя list и retrieve методы."""
@@ -13,3 +24,60 @@ class CreateList(mixins.CreateModelMixin,
                  mixins.ListModelMixin,
                  GenericViewSet):
     """Класс, включающий в себя create и list методы."""
+
+
+class ConditionalCacheMixin:
+    """Отдает list и retrieve справочника из кэша готовых байтов.
+
+    ETag и Last-Modified строятся из версии справочника, поэтому
+    на совпавший условный запрос 304 отдается без обращения к кэшу
+    ответов, ORM и сериализатору.
+    """
+    reference_name: str
+
+    def list(self, request: Request, *args, **kwargs) -> HttpResponse:
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request: Request, *args, **kwargs) -> HttpResponse:
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cached_response(
+            self,
+            handler: Callable,
+            request: Request,
+            *args,
+            **kwargs
+    ) -> HttpResponse:
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, JSONRenderer):
+            return handler(request, *args, **kwargs)
+        version = get_version(self.reference_name)
+        path = request.get_full_path()
+        etag = get_etag(self.reference_name, version, path)
+        last_modified = int(float(version))
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+        key = get_content_key(self.reference_name, version, path)
+        content = reference_cache.get(key)
+        if content is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content = renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            reference_cache.set(key, content)
+        response = HttpResponse(content, content_type=renderer.media_type)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
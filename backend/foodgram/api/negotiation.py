@@ -0,0 +1,24 @@
+from typing import Any, List, Optional, Tuple
+
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.renderers import BaseRenderer
+from rest_framework.request import Request
+
+
+class IgnoreFormatContentNegotiation(BaseContentNegotiation):
+    """Всегда выбирает первый рендерер вью.
+
+    Нужен действиям, которые сами формируют ответ по параметру format
+    и не должны получать 404 от стандартного согласования DRF.
+    """
+
+    def select_parser(self, request: Request, parsers: List) -> Any:
+        return parsers[0]
+
+    def select_renderer(
+            self,
+            request: Request,
+            renderers: List[BaseRenderer],
+            format_suffix: Optional[str] = None
+    ) -> Tuple[BaseRenderer, str]:
+        return renderers[0], renderers[0].media_type
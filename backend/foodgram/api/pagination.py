@@ -1,10 +1,274 @@
-from typing import Any
+import base64
+import binascii
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+from django.core.exceptions import ValidationError
+from django.db.models import Field, Q, QuerySet, prefetch_related_objects
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api import constants
 
 
 class CustomPagination(pagination.PageNumberPagination):
     """Кастомный пагинатор для вывода ответа без лишних полей."""
     def get_paginated_response(self, data: Any) -> Response:
         return Response(data)
+
+
+class LimitPageNumberPagination(pagination.PageNumberPagination):
+    """Постраничный вывод с размером страницы из параметра limit."""
+    page_size_query_param = 'limit'
+
+
+class KeysetPagination(pagination.BasePagination):
+    """Курсорная пагинация по ключу сортировки без OFFSET и COUNT.
+
+    Страница выбирается условием "после последней записи" по полям
+    сортировки с id на конце, курсор хранит значения этих полей.
+    Сортировка берется из OrderingFilter вьюсета, по умолчанию
+    (-pub_date, id).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = api_settings.PAGE_SIZE
+    default_ordering: Tuple[str, ...] = ('-pub_date', 'id')
+
+    @classmethod
+    def is_requested(cls, request: Request) -> bool:
+        """Курсорный режим включается параметром pagination=cursor."""
+        return (
+            request.query_params.get('pagination')
+            == constants.KEYSET_PAGINATION_MODE
+            or cls.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(
+            self,
+            queryset: QuerySet,
+            request: Request,
+            view: Any = None
+    ) -> List:
+        self.request = request
+        self.ordering = self.get_ordering(request, queryset, view)
+        page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request, queryset)
+        ordering = self.ordering
+        if reverse:
+            ordering = [self._invert(field) for field in ordering]
+        page = self.fetch(queryset, ordering, values, page_size + 1)
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        if reverse:
+            page.reverse()
+        # Назад от курсора всегда есть следующая страница,
+        # вперед от курсора - предыдущая.
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else values is not None
+        self.next_values = self.previous_values = None
+        if page and has_next:
+            self.next_values = self._values(page[-1])
+        if page and has_previous:
+            self.previous_values = self._values(page[0])
+        return page
+
+    def fetch(
+            self,
+            queryset: QuerySet,
+            ordering: List[str],
+            values: Optional[List],
+            limit: int
+    ) -> List:
+        """Первые limit записей строго после курсора."""
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(ordering, values))
+        return list(queryset[:limit])
+
+    def get_paginated_response(self, data: Any) -> Response:
+        return Response({
+            'next': self.get_link(self.next_values, reverse=False),
+            'previous': self.get_link(self.previous_values, reverse=True),
+            'results': data,
+        })
+
+    def get_ordering(
+            self,
+            request: Request,
+            queryset: QuerySet,
+            view: Any
+    ) -> List[str]:
+        """Сортировка из OrderingFilter с id для однозначности."""
+        ordering = None
+        for backend in getattr(view, 'filter_backends', ()):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+        ordering = list(ordering or self.default_ordering)
+        if not {'id', '-id'} & set(ordering):
+            ordering.append('id')
+        return ordering
+
+    def get_page_size(self, request: Request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, constants.KEYSET_MAX_PAGE_SIZE)
+
+    def decode_cursor(
+            self,
+            request: Request,
+            queryset: Any
+    ) -> Tuple[Optional[List], bool]:
+        """Возвращает значения ключа и направление из курсора.
+
+        Каждое значение приводится к типу своего поля сортировки,
+        поэтому подделанный курсор дает 404, а не ошибку в запросе.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values, reverse = cursor['v'], bool(cursor['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound('Некорректный курсор.')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound('Некорректный курсор.')
+        try:
+            values = [
+                self._to_python(
+                    self.get_field(queryset, field.lstrip('-')), value
+                )
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound('Некорректный курсор.')
+        return values, reverse
+
+    def get_field(self, queryset: Any, name: str) -> Field:
+        """Поле модели или аннотации, по которому идет сортировка."""
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(name)
+
+    def encode_cursor(self, values: List, reverse: bool) -> str:
+        cursor: Dict[str, Any] = {'v': values, 'r': int(reverse)}
+        return base64.urlsafe_b64encode(
+            json.dumps(cursor, separators=(',', ':')).encode()
+        ).decode()
+
+    def get_link(self, values: Optional[List], reverse: bool) -> Optional[str]:
+        if values is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'pagination')
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(values, reverse)
+        )
+
+    def _values(self, instance: Any) -> List:
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            values.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value
+            )
+        return values
+
+    @staticmethod
+    def _to_python(field: Field, value: Any) -> Any:
+        if value is None or isinstance(value, (dict, list)):
+            raise ValueError(value)
+        return field.to_python(value)
+
+    @staticmethod
+    def _invert(field: str) -> str:
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _seek(ordering: List[str], values: List) -> Q:
+        """Условие "строго после курсора" для составного ключа.
+
+        Дополнительная граница по первому полю позволяет базе
+        начать чтение индекса сразу с нужного места.
+        """
+        fields = [field.lstrip('-') for field in ordering]
+        lookups = ['lt' if field.startswith('-') else 'gt'
+                   for field in ordering]
+        condition = Q()
+        for position, (field, lookup) in enumerate(zip(fields, lookups)):
+            equal = dict(zip(fields[:position], values[:position]))
+            condition |= Q(
+                **equal, **{f'{field}__{lookup}': values[position]}
+            )
+        bound = Q(**{f'{fields[0]}__{lookups[0]}e': values[0]})
+        return bound & condition
+
+
+class FeedPagination(KeysetPagination):
+    """Курсорная пагинация ленты по нескольким источникам.
+
+    Страница берется из каждого источника тем же условием после
+    курсора, источники сливаются по ключу сортировки ленты.
+    Сортировка ленты фиксирована и не зависит от параметра ordering.
+    """
+    default_ordering = constants.FEED_ORDERING
+
+    def get_ordering(
+            self,
+            request: Request,
+            queryset: Any,
+            view: Any
+    ) -> List[str]:
+        return list(self.default_ordering)
+
+    def get_field(self, queryset: Any, name: str) -> Field:
+        return super().get_field(queryset[0], name)
+
+    def fetch(
+            self,
+            queryset: List[QuerySet],
+            ordering: List[str],
+            values: Optional[List],
+            limit: int
+    ) -> List:
+        page: Dict[int, Any] = {}
+        lookups: Set = set()
+        for source in queryset:
+            # Связанные объекты подгружаются один раз для всей страницы.
+            lookups.update(source._prefetch_related_lookups)
+            for instance in super().fetch(
+                    source.prefetch_related(None), ordering, values, limit
+            ):
+                page.setdefault(instance.pk, instance)
+        fields = [field.lstrip('-') for field in ordering]
+        result = sorted(
+            page.values(),
+            key=lambda instance: [
+                getattr(instance, field) for field in fields
+            ],
+            reverse=ordering[0].startswith('-')
+        )[:limit]
+        prefetch_related_objects(result, *lookups)
+        return result
+
+
+def get_recipes_limit(request: Optional[Request]) -> Optional[int]:
+    """Возвращает положительный recipes_limit из запроса или None."""
+    if request is None:
+        return None
+    try:
+        recipes_limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+    return recipes_limit if recipes_limit > 0 else None
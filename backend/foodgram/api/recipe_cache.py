@@ -0,0 +1,84 @@
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from django.conf import settings
+
+from api import constants
+from api.batching import OnCommitBatch
+from api.cache import CountingCache
+from api.reference_cache import get_reference_versions
+from recipes.models import Recipe
+
+recipe_cache = CountingCache('recipe_fragments', settings.RECIPE_CACHE_ALIAS)
+
+
+def get_versions() -> Tuple[str, str]:
+    """Версии справочников, от которых зависит представление рецепта."""
+    tags_version, ingredients_version = get_reference_versions(
+        constants.REFERENCE_TAGS, constants.REFERENCE_INGREDIENTS
+    )
+    return tags_version, ingredients_version
+
+
+def get_recipe_key(
+        recipe_id: int,
+        versions: Optional[Tuple[str, str]] = None
+) -> str:
+    """Ключ представления рецепта.
+
+    В ключ входят версии тегов и ингредиентов, поэтому их правка
+    делает недействительными сразу все сохраненные рецепты.
+    """
+    tags_version, ingredients_version = versions or get_versions()
+    return (
+        f'{constants.RECIPE_CACHE_PREFIX}:{tags_version}:'
+        f'{ingredients_version}:{recipe_id}'
+    )
+
+
+def get_fragment(
+        recipe: Recipe,
+        versions: Optional[Tuple[str, str]] = None
+) -> Optional[Dict]:
+    """Представление рецепта из кэша, если оно не старше рецепта.
+
+    Вместе с представлением хранится время изменения рецепта. Правка
+    в другом воркере или в фоновой задаче меняет его в базе, поэтому
+    устаревшая запись не отдается даже с кэшем в памяти процесса.
+    """
+    entry = recipe_cache.get(
+        get_recipe_key(recipe.pk, versions),
+        is_valid=lambda entry: entry[0] == recipe.updated
+    )
+    return None if entry is None else entry[1]
+
+
+def set_fragment(
+        recipe: Recipe,
+        representation: Dict,
+        versions: Optional[Tuple[str, str]] = None
+) -> None:
+    """Сохраняет представление рецепта вместе со временем его правки."""
+    recipe_cache.set(
+        get_recipe_key(recipe.pk, versions), (recipe.updated, representation)
+    )
+
+
+def delete_fragments(recipe_ids: Set[int]) -> None:
+    versions = get_versions()
+    recipe_cache.backend.delete_many(
+        [get_recipe_key(recipe_id, versions) for recipe_id in recipe_ids]
+    )
+
+
+fragment_invalidations = OnCommitBatch(delete_fragments)
+
+
+def invalidate_recipes(recipe_ids: Iterable[int]) -> None:
+    """Удаляет представления рецептов после фиксации транзакции.
+
+    Рецепты из всех вызовов в одной транзакции удаляются вместе,
+    и версии справочников читаются из базы один раз.
+    """
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        fragment_invalidations.add(recipe_ids)
@@ -0,0 +1,388 @@
+import logging
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+from api import constants
+from api.batching import OnCommitBatch
+from recipes.models import RecipeIngredient
+
+logger = logging.getLogger(__name__)
+
+NONZERO_BYTE = re.compile(b'[^\x00]')
+BUILD_CHUNK_SIZE = 10000
+
+Match = Tuple[int, int, int]
+
+
+def popcount(bitmap: int) -> int:
+    return bin(bitmap).count('1')
+
+
+def to_bitmap(positions: Iterable[int]) -> int:
+    """Битовая карта из позиций: бит p выставлен для каждой позиции p."""
+    positions = list(positions)
+    if not positions:
+        return 0
+    data = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, 'little')
+
+
+def add_bitmap(planes: List[int], bitmap: int) -> None:
+    """Прибавляет единицу к счетчикам, разложенным по битовым
+    плоскостям, во всех позициях из bitmap."""
+    carry = bitmap
+    for bit, plane in enumerate(planes):
+        if not carry:
+            return
+        planes[bit], carry = plane ^ carry, plane & carry
+    if carry:
+        planes.append(carry)
+
+
+def subtract_planes(
+        minuend: List[int],
+        subtrahend: List[int],
+        mask: int
+) -> List[int]:
+    """Поразрядная разность счетчиков в позициях из mask."""
+    result = []
+    borrow = 0
+    for bit in range(max(len(minuend), len(subtrahend))):
+        a = minuend[bit] if bit < len(minuend) else 0
+        b = subtrahend[bit] if bit < len(subtrahend) else 0
+        result.append((a ^ b ^ borrow) & mask)
+        borrow = ((~a & b) | (~(a ^ b) & borrow)) & mask
+    return result
+
+
+def equal_to(planes: List[int], value: int, mask: int) -> int:
+    """Позиции из mask, в которых счетчик равен value."""
+    if value >> len(planes):
+        return 0
+    for bit, plane in enumerate(planes):
+        mask &= plane if value >> bit & 1 else ~plane
+        if not mask:
+            break
+    return mask
+
+
+def iter_positions(bitmap: int) -> Iterator[int]:
+    """Позиции выставленных битов от старших к младшим."""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'big')
+    last = len(data) - 1
+    for match in NONZERO_BYTE.finditer(data):
+        byte = data[match.start()]
+        base = (last - match.start()) * 8
+        for bit in range(7, -1, -1):
+            if byte >> bit & 1:
+                yield base + bit
+
+
+class RecipeMatches:
+    """Рецепты, подходящие под набор ингредиентов.
+
+    Рецепты разбиты на группы по числу недостающих ингредиентов
+    (по возрастанию) и числу совпавших (по убыванию), внутри группы
+    новые рецепты идут первыми. Группы разворачиваются в id только
+    для запрошенного среза, поэтому срез поддерживается пагинатором.
+    """
+
+    def __init__(
+            self,
+            groups: Iterator[Tuple[int, int, int]],
+            total: int,
+            recipe_ids: array
+    ) -> None:
+        self._groups = groups
+        self._counted: List[Tuple[int, int, int, int]] = []
+        self._total = total
+        self._recipe_ids = recipe_ids
+
+    def __len__(self) -> int:
+        return self._total
+
+    def count(self) -> int:
+        return self._total
+
+    def _iter_counted(self) -> Iterator[Tuple[int, int, int, int]]:
+        yield from self._counted
+        for missing, matched, bitmap in self._groups:
+            group = (missing, matched, bitmap, popcount(bitmap))
+            self._counted.append(group)
+            yield group
+
+    def __getitem__(self, index: slice) -> List[Match]:
+        """Срез (recipe_id, совпало, не хватает) в порядке выдачи."""
+        start, stop, _ = index.indices(self._total)
+        result: List[Match] = []
+        offset = 0
+        for missing, matched, bitmap, size in self._iter_counted():
+            if offset + size <= start:
+                offset += size
+                continue
+            for position in iter_positions(bitmap):
+                if offset >= stop:
+                    return result
+                if offset >= start:
+                    result.append(
+                        (self._recipe_ids[position], matched, missing)
+                    )
+                offset += 1
+            if offset >= stop:
+                break
+        return result
+
+
+class RecipeIngredientIndex:
+    """Инвертированный индекс ингредиент -> рецепты в памяти процесса.
+
+    Рецепт получает позицию, позиции идут по возрастанию id рецепта.
+    Для каждого ингредиента хранится отсортированный массив позиций
+    рецептов, а для частых ингредиентов еще и битовая карта. Поиск
+    складывает битовые карты выбранных ингредиентов в поразрядные
+    счетчики, так что пересечения и подсчет совпадений идут целыми
+    машинными словами, а не по одному рецепту.
+
+    Изменения рецептов этого процесса применяются к индексу сразу,
+    изменения из других воркеров - при фоновом перестроении раз
+    в RECIPE_INGREDIENT_INDEX_TTL секунд.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._built_at: Optional[float] = None
+        self._rebuilding = False
+        self._changed_while_rebuilding: Set[int] = set()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._positions: Dict[int, int] = {}
+        self._recipe_ids = array('I')
+        self._starts = array('I')
+        self._sizes = array('H')
+        self._items = array('I')
+        self._postings: Dict[int, array] = {}
+        self._bitmaps: Dict[int, int] = {}
+        self._size_planes: List[int] = []
+
+    def build(self) -> None:
+        """Загружает связи рецептов и ингредиентов и заменяет индекс."""
+        positions: Dict[int, int] = {}
+        recipe_ids = array('I')
+        starts = array('I')
+        sizes = array('H')
+        items = array('I')
+        postings: Dict[int, array] = defaultdict(lambda: array('I'))
+        rows = RecipeIngredient.objects.order_by(
+            'recipe_id', 'ingredient_id'
+        ).values_list('recipe_id', 'ingredient_id')
+        position = -1
+        for recipe_id, ingredient_id in rows.iterator(
+                chunk_size=BUILD_CHUNK_SIZE
+        ):
+            if not recipe_ids or recipe_ids[-1] != recipe_id:
+                position = len(recipe_ids)
+                positions[recipe_id] = position
+                recipe_ids.append(recipe_id)
+                starts.append(len(items))
+                sizes.append(0)
+            sizes[position] += 1
+            items.append(ingredient_id)
+            postings[ingredient_id].append(position)
+        size_planes: List[int] = []
+        for bit in range(max(sizes, default=0).bit_length()):
+            size_planes.append(to_bitmap(
+                position for position, size in enumerate(sizes)
+                if size >> bit & 1
+            ))
+        with self._lock:
+            self._positions = positions
+            self._recipe_ids = recipe_ids
+            self._starts = starts
+            self._sizes = sizes
+            self._items = items
+            self._postings = dict(postings)
+            self._bitmaps = {}
+            self._size_planes = size_planes
+            self._built_at = time.monotonic()
+
+    def warm_up(self) -> None:
+        """Строит индекс при старте, не падая без готовой базы."""
+        try:
+            self.build()
+        except DatabaseError:
+            logger.warning(
+                'Recipe ingredient index warm-up skipped', exc_info=True
+            )
+
+    def _rebuild_in_background(self) -> None:
+        try:
+            self.build()
+            with self._lock:
+                changed = self._changed_while_rebuilding
+                self._changed_while_rebuilding = set()
+            if changed:
+                self.update_recipes(changed)
+        except DatabaseError:
+            logger.warning('Recipe ingredient index rebuild failed',
+                           exc_info=True)
+        finally:
+            self._rebuilding = False
+            connection.close()
+
+    def _ensure_fresh(self) -> None:
+        """Первое построение идет в запросе, последующие - в фоне,
+        а запросы пока читают прежнюю версию индекса."""
+        if self._built_at is None:
+            with self._lock:
+                if self._built_at is None:
+                    self.build()
+            return
+        ttl = settings.RECIPE_INGREDIENT_INDEX_TTL
+        if time.monotonic() - self._built_at <= ttl or self._rebuilding:
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(
+            target=self._rebuild_in_background, daemon=True
+        ).start()
+
+    def _bitmap(self, ingredient_id: int) -> int:
+        """Битовая карта рецептов ингредиента.
+
+        Карты частых ингредиентов хранятся, остальные строятся
+        из массива позиций на время запроса.
+        """
+        bitmap = self._bitmaps.get(ingredient_id)
+        if bitmap is not None:
+            return bitmap
+        positions = self._postings.get(ingredient_id, ())
+        bitmap = to_bitmap(positions)
+        if len(positions) * constants.RECIPE_INDEX_DENSE_RATIO > len(
+                self._recipe_ids):
+            self._bitmaps[ingredient_id] = bitmap
+        return bitmap
+
+    def _set_bit(self, ingredient_id: int, position: int, value: bool) -> None:
+        bitmap = self._bitmaps.get(ingredient_id)
+        if bitmap is None:
+            return
+        if value:
+            self._bitmaps[ingredient_id] = bitmap | 1 << position
+        else:
+            self._bitmaps[ingredient_id] = bitmap & ~(1 << position)
+
+    def _set_size(self, position: int, size: int) -> None:
+        self._size_planes.extend(
+            [0] * (size.bit_length() - len(self._size_planes))
+        )
+        for bit, plane in enumerate(self._size_planes):
+            if size >> bit & 1:
+                self._size_planes[bit] = plane | 1 << position
+            else:
+                self._size_planes[bit] = plane & ~(1 << position)
+        self._sizes[position] = size
+
+    def _apply(self, recipe_id: int, ingredient_ids: List[int]) -> None:
+        """Заменяет набор ингредиентов рецепта в индексе."""
+        position = self._positions.get(recipe_id)
+        if position is None:
+            if not ingredient_ids:
+                return
+            position = len(self._recipe_ids)
+            self._positions[recipe_id] = position
+            self._recipe_ids.append(recipe_id)
+            self._starts.append(len(self._items))
+            self._sizes.append(0)
+            old: Set[int] = set()
+        else:
+            start = self._starts[position]
+            old = set(self._items[start:start + self._sizes[position]])
+        new = set(ingredient_ids)
+        for ingredient_id in old - new:
+            postings = self._postings[ingredient_id]
+            del postings[bisect_left(postings, position)]
+            self._set_bit(ingredient_id, position, False)
+        for ingredient_id in new - old:
+            insort(self._postings.setdefault(ingredient_id, array('I')),
+                   position)
+            self._set_bit(ingredient_id, position, True)
+        # Старый срез в items остается мусором до перестроения.
+        self._starts[position] = len(self._items)
+        self._items.extend(sorted(new))
+        self._set_size(position, len(new))
+
+    def update_recipes(self, recipe_ids: Iterable[int]) -> None:
+        """Перечитывает ингредиенты рецептов из базы и применяет их.
+
+        Удаленные рецепты получают пустой набор и больше не находятся.
+        """
+        recipe_ids = set(recipe_ids)
+        if self._built_at is None:
+            return
+        current: Dict[int, List[int]] = {
+            recipe_id: [] for recipe_id in recipe_ids
+        }
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids
+        ).order_by().values_list('recipe_id', 'ingredient_id'):
+            current[recipe_id].append(ingredient_id)
+        with self._lock:
+            if self._rebuilding:
+                self._changed_while_rebuilding |= recipe_ids
+            for recipe_id in sorted(current):
+                self._apply(recipe_id, current[recipe_id])
+
+    def search(
+            self,
+            ingredient_ids: Iterable[int],
+            max_missing: int = 0
+    ) -> RecipeMatches:
+        """Рецепты, в которых есть хотя бы один из ингредиентов
+        и не хватает не больше max_missing ингредиентов."""
+        self._ensure_fresh()
+        with self._lock:
+            matched_planes: List[int] = []
+            candidates = 0
+            for ingredient_id in set(ingredient_ids):
+                bitmap = self._bitmap(ingredient_id)
+                candidates |= bitmap
+                add_bitmap(matched_planes, bitmap)
+            missing_planes = subtract_planes(
+                self._size_planes, matched_planes, candidates
+            )
+            recipe_ids = self._recipe_ids
+        by_missing = [
+            equal_to(missing_planes, missing, candidates)
+            for missing in range(max_missing + 1)
+        ]
+        total = sum(popcount(bitmap) for bitmap in by_missing)
+        max_matched = (1 << len(matched_planes)) - 1
+
+        def groups() -> Iterator[Tuple[int, int, int]]:
+            for missing, bitmap in enumerate(by_missing):
+                for matched in range(max_matched, 0, -1):
+                    if not bitmap:
+                        break
+                    group = equal_to(matched_planes, matched, bitmap)
+                    if group:
+                        bitmap &= ~group
+                        yield missing, matched, group
+
+        return RecipeMatches(groups(), total, recipe_ids)
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
+index_updates = OnCommitBatch(recipe_ingredient_index.update_recipes)
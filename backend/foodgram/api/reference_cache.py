@@ -0,0 +1,75 @@
+import hashlib
+from datetime import datetime
+from typing import Dict, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.http import quote_etag
+
+from api import constants
+from api.cache import CountingCache
+from recipes.models import ReferenceVersion
+
+reference_cache = CountingCache('reference', settings.REFERENCE_CACHE_ALIAS)
+
+
+def format_version(updated: datetime) -> str:
+    return f'{updated.timestamp():.6f}'
+
+
+def get_reference_versions(*names: str) -> Tuple[str, ...]:
+    """Возвращает текущие версии справочников одним запросом,
+    заводя отсутствующие.
+
+    Версия - время последнего изменения справочника в секундах,
+    из нее же берется заголовок Last-Modified.
+    """
+    versions: Dict[str, datetime] = dict(
+        ReferenceVersion.objects.filter(
+            name__in=names
+        ).values_list('name', 'updated')
+    )
+    missing = [name for name in names if name not in versions]
+    if missing:
+        ReferenceVersion.objects.bulk_create(
+            [
+                ReferenceVersion(name=name, updated=timezone.now())
+                for name in missing
+            ],
+            ignore_conflicts=True
+        )
+        versions.update(
+            ReferenceVersion.objects.filter(
+                name__in=missing
+            ).values_list('name', 'updated')
+        )
+    return tuple(format_version(versions[name]) for name in names)
+
+
+def get_version(name: str) -> str:
+    return get_reference_versions(name)[0]
+
+
+def bump_version(name: str) -> None:
+    """Сдвигает версию, после чего старые ответы больше не читаются."""
+    now = timezone.now()
+    if not ReferenceVersion.objects.filter(name=name).update(updated=now):
+        ReferenceVersion.objects.bulk_create(
+            [ReferenceVersion(name=name, updated=now)], ignore_conflicts=True
+        )
+
+
+def get_path_digest(path: str) -> str:
+    return hashlib.sha256(path.encode()).hexdigest()
+
+
+def get_content_key(name: str, version: str, path: str) -> str:
+    """Ключ готового ответа: справочник, его версия и URL запроса."""
+    return (
+        f'{constants.REFERENCE_CACHE_PREFIX}:{name}:{version}:'
+        f'{get_path_digest(path)}'
+    )
+
+
+def get_etag(name: str, version: str, path: str) -> str:
+    return quote_etag(f'{name}-{version}-{get_path_digest(path)[:16]}')
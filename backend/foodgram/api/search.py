@@ -0,0 +1,133 @@
+import re
+from typing import Dict, Iterable, List
+
+from django.db import connections, transaction
+from django.db.models import FloatField, OuterRef, Q, QuerySet, Subquery, Value
+from django.db.models.expressions import RawSQL
+
+from api import constants
+from api.batching import OnCommitBatch
+from recipes.models import Recipe, RecipeIngredient, RecipeSearch
+
+
+def get_terms(query: str) -> List[str]:
+    """Слова поискового запроса в нижнем регистре."""
+    return re.findall(r'\w+', query.lower())[:constants.RECIPE_SEARCH_TERMS]
+
+
+def search_recipes(queryset: QuerySet, query: str) -> QuerySet:
+    """Оставляет рецепты, в документе которых есть все слова запроса,
+    и добавляет аннотацию search_rank - релевантность рецепта.
+
+    Каждое слово ищется как префикс, чтобы поиск работал по мере
+    набора текста. Совпадения в названии весят больше, чем
+    в ингредиентах, а в ингредиентах - больше, чем в описании.
+    """
+    terms = get_terms(query)
+    if not terms:
+        return queryset.none().annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        return _search_postgresql(queryset, terms)
+    if vendor == 'sqlite':
+        return _search_sqlite(queryset, terms)
+    condition = Q()
+    for term in terms:
+        condition &= (
+            Q(search_document__name__icontains=term)
+            | Q(search_document__ingredients__icontains=term)
+            | Q(search_document__text__icontains=term)
+        )
+    return queryset.filter(condition).annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    )
+
+
+def _search_postgresql(queryset: QuerySet, terms: List[str]) -> QuerySet:
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    params = (constants.RECIPE_SEARCH_CONFIG, tsquery)
+    matched = RawSQL(
+        'SELECT recipe_id FROM recipes_recipesearch '
+        'WHERE vector @@ to_tsquery(%s::regconfig, %s)',
+        params
+    )
+    # Ранг приводится к double precision, чтобы значение из курсора
+    # пагинации совпадало с посчитанным в базе.
+    rank = RecipeSearch.objects.filter(recipe=OuterRef('pk')).annotate(
+        rank=RawSQL(
+            'ts_rank_cd(vector, to_tsquery(%s::regconfig, %s))'
+            '::double precision',
+            params,
+            output_field=FloatField()
+        )
+    ).values('rank')
+    return queryset.filter(pk__in=matched).annotate(
+        search_rank=Subquery(rank, output_field=FloatField())
+    )
+
+
+def _search_sqlite(queryset: QuerySet, terms: List[str]) -> QuerySet:
+    match = ' '.join(f'"{term}"*' for term in terms)
+    # bm25 считается только в запросе с MATCH по самой таблице FTS5,
+    # поэтому она присоединяется к выборке, а не опрашивается
+    # подзапросом для каждого рецепта.
+    queryset = queryset.extra(
+        tables=['recipes_recipesearch_fts'],
+        where=[
+            'recipes_recipesearch_fts MATCH %s',
+            f'recipes_recipesearch_fts.rowid = "{Recipe._meta.db_table}".id',
+        ],
+        params=[match],
+    )
+    # bm25 тем меньше, чем лучше совпадение; веса колонок
+    # (название, ингредиенты, описание) как у setweight в PostgreSQL.
+    return queryset.annotate(search_rank=RawSQL(
+        '-bm25(recipes_recipesearch_fts, 10.0, 4.0, 1.0)', (),
+        output_field=FloatField()
+    ))
+
+
+def update_search_documents(recipe_ids: Iterable[int]) -> None:
+    """Пересобирает поисковые документы рецептов.
+
+    Индекс в базе обновляется триггерами при записи документов.
+    """
+    recipe_ids = sorted(set(recipe_ids))
+    batch_size = constants.RECIPE_SEARCH_BATCH_SIZE
+    for start in range(0, len(recipe_ids), batch_size):
+        batch = recipe_ids[start:start + batch_size]
+        ingredients: Dict[int, List[str]] = {}
+        for recipe_id, name in RecipeIngredient.objects.filter(
+                recipe_id__in=batch
+        ).order_by('ingredient__name').values_list(
+            'recipe_id', 'ingredient__name'
+        ):
+            ingredients.setdefault(recipe_id, []).append(name)
+        documents = [
+            RecipeSearch(
+                recipe_id=recipe_id,
+                name=name,
+                ingredients=' '.join(ingredients.get(recipe_id, ())),
+                text=text,
+            )
+            for recipe_id, name, text in Recipe.objects.filter(
+                pk__in=batch
+            ).values_list('id', 'name', 'text')
+        ]
+        with transaction.atomic():
+            RecipeSearch.objects.filter(recipe_id__in=batch).delete()
+            RecipeSearch.objects.bulk_create(documents)
+
+
+search_updates = OnCommitBatch(update_search_documents)
+
+
+def schedule_search_update(recipe_ids: Iterable[int]) -> None:
+    """Пересобирает документы рецептов после фиксации транзакции.
+
+    Рецепты из всех вызовов в одной транзакции собираются вместе,
+    и каждый документ строится один раз.
+    """
+    search_updates.add(recipe_ids)
@@ -1,27 +1,34 @@
-import base64
-import uuid
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
-from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.urls import reverse
+from django.utils.functional import cached_property
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.fields import IntegerField
 from rest_framework.utils.serializer_helpers import ReturnDict
 
 from api import constants
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Subscribe, Tag
+from api.jobs import schedule_recipe_image
+from api.pagination import get_recipes_limit
+from api.recipe_cache import get_fragment, get_versions, set_fragment
+from api.uploads import check_image_size, decode_base64_image
+from recipes.models import (Ingredient, Job, Recipe, RecipeIngredient,
+                            Subscribe, Tag)
 from users.models import User
 
 
 class Base64ImageField(serializers.ImageField):
-    """Кодировка изображений в формате base64."""
+    """Картинка строкой base64 в JSON или файлом в multipart/form-data."""
 
-    def to_internal_value(self, data) -> uuid.UUID:
-        """Ввод является допустимой строкой UUID"""
+    def to_internal_value(self, data) -> UploadedFile:
+        """Декодирует base64 кусками и проверяет размер картинки."""
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = decode_base64_image(data)
+        elif isinstance(data, UploadedFile):
+            check_image_size(data.size)
 
         return super().to_internal_value(data)
 
@@ -42,13 +49,20 @@ class CustomUserSerializer(UserSerializer):
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
+        representation['is_subscribed'] = self.is_subscribed(instance)
+        return representation
+
+    def is_subscribed(self, instance: User) -> bool:
+        """Подписан ли текущий пользователь на instance."""
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
+        if not request or not request.user.is_authenticated:
+            return instance.is_subscribed
+        is_subscribed = getattr(instance, 'is_author_subscribed', None)
+        if is_subscribed is None:
             is_subscribed = request.user.follower.filter(
                 following=instance
             ).exists()
-            representation['is_subscribed'] = is_subscribed
-        return representation
+        return is_subscribed
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -105,20 +119,106 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         source='recipe_ingredients'
     )
     author = CustomUserSerializer()
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields: Tuple[str, ...] = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time')
+            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
+            'favorites_count')
+
+    @cached_property
+    def versions(self) -> Tuple[str, str]:
+        """Версии справочников, одни на весь список рецептов."""
+        return get_versions()
+
+    def to_representation(self, instance: Recipe) -> Dict:
+        """Берет общее для всех представление рецепта из кэша
+        и накладывает на него данные текущего пользователя."""
+        is_author_subscribed = getattr(instance, 'is_author_subscribed', None)
+        if is_author_subscribed is not None:
+            instance.author.is_author_subscribed = is_author_subscribed
+        representation = get_fragment(instance, self.versions)
+        if representation is None:
+            representation = super().to_representation(instance)
+            set_fragment(instance, {
+                **representation,
+                'image': instance.image.url if instance.image else None,
+            }, self.versions)
+            return representation
+        request = self.context.get('request')
+        if request is not None and representation['image']:
+            representation['image'] = request.build_absolute_uri(
+                representation['image']
+            )
+        representation['author']['is_subscribed'] = (
+            self.fields['author'].is_subscribed(instance.author)
+        )
+        representation['is_favorited'] = self.get_is_favorited(instance)
+        representation['is_in_shopping_cart'] = (
+            self.get_is_in_shopping_cart(instance)
+        )
+        # Счетчик меняется без сигналов модели и в кэш не попадает.
+        representation['favorites_count'] = instance.favorites_count
+        return representation
+
+    def _user_recipe_exists(
+            self,
+            obj: Recipe,
+            annotation: str,
+            related_name: str
+    ) -> bool:
+        """Берет флаг из аннотации запроса, а без нее делает запрос."""
+        value = getattr(obj, annotation, None)
+        if value is not None:
+            return value
+        request = self.context.get('request')
+        if not request or not request.user.is_authenticated:
+            return False
+        return getattr(request.user, related_name).filter(recipe=obj).exists()
+
+    def get_is_favorited(self, obj: Recipe) -> bool:
+        """Возвращает True, если рецепт в избранном пользователя."""
+        return self._user_recipe_exists(obj, 'is_favorited', 'favorites')
+
+    def get_is_in_shopping_cart(self, obj: Recipe) -> bool:
+        """Возвращает True, если рецепт в списке покупок пользователя."""
+        return self._user_recipe_exists(
+            obj, 'is_in_shopping_cart', 'shopping_carts'
+        )
 
 
-class CustomIngredientCreateSerializer(serializers.ModelSerializer):
-    """Сериализатор поля ingredients в сериализаторе создания рецептов."""
-    id = serializers.PrimaryKeyRelatedField(
-        source='ingredient',
-        queryset=Ingredient.objects.all()
+class RecipeMatchSerializer(RecipeReadSerializer):
+    """Рецепт с числом совпавших и недостающих ингредиентов."""
+
+    def to_representation(self, instance: Recipe) -> Dict:
+        representation = super().to_representation(instance)
+        representation['matched_ingredients'] = instance.matched_ingredients
+        representation['missing_ingredients'] = instance.missing_ingredients
+        return representation
+
+
+class RecipeMatchQuerySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+    ingredients = serializers.ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=constants.COOK_MAX_INGREDIENTS
     )
+    missing = IntegerField(
+        min_value=0, max_value=constants.COOK_MAX_MISSING, default=0
+    )
+
+
+class CustomIngredientCreateSerializer(serializers.ModelSerializer):
+    """Сериализатор поля ingredients в сериализаторе создания рецептов.
+
+    Существование ингредиентов проверяется одним запросом
+    в RecipeCreateSerializer.validate.
+    """
+    id = serializers.IntegerField(source='ingredient_id')
     amount = IntegerField(
         max_value=constants.NUMBER_MAX, min_value=constants.NUMBER_MIN
     )
@@ -129,8 +229,13 @@ class CustomIngredientCreateSerializer(serializers.ModelSerializer):
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания рецептов."""
+    """Сериализатор для создания рецептов.
+
+    Теги приходят списком id, и их существование, как и ингредиентов,
+    проверяется одним запросом в validate.
+    """
     ingredients = CustomIngredientCreateSerializer(many=True)
+    tags = serializers.ListField(child=IntegerField(min_value=1))
     image = Base64ImageField(required=True)
     cooking_time = IntegerField(
         max_value=constants.NUMBER_MAX, min_value=constants.NUMBER_MIN
@@ -158,8 +263,35 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         if not tags:
             raise serializers.ValidationError("Tags field is required.")
 
+        ingredient_ids = {item['ingredient_id'] for item in ingredients}
+        if len(ingredient_ids) != len(ingredients):
+            raise serializers.ValidationError(
+                {'ingredients': 'Ингредиенты не должны повторяться.'}
+            )
+        if Ingredient.objects.filter(
+                pk__in=ingredient_ids
+        ).count() != len(ingredient_ids):
+            raise serializers.ValidationError(
+                {'ingredients': 'Ингредиент не найден.'}
+            )
+
+        tag_ids = set(tags)
+        if Tag.objects.filter(pk__in=tag_ids).count() != len(tag_ids):
+            raise serializers.ValidationError({'tags': 'Тег не найден.'})
+        data['tags'] = sorted(tag_ids)
+
         return data
 
+    def save(self, **kwargs) -> Recipe:
+        """Закрывает загруженную картинку после сохранения рецепта."""
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    @transaction.atomic
     def create(self, validated_data: Dict) -> ReturnDict:
         """Создает и возвращает объект рецепта."""
         ingredients = validated_data.pop('ingredients')
@@ -168,33 +300,72 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe_ingredients = [
             RecipeIngredient(
                 recipe=instance,
-                ingredient=ingredient_data.get('ingredient'),
+                ingredient_id=ingredient_data.get('ingredient_id'),
                 amount=ingredient_data.get('amount')
             )
             for ingredient_data in ingredients
         ]
         instance.recipe_ingredients.bulk_create(recipe_ingredients)
+        schedule_recipe_image(instance)
         return instance
 
-    def update(self, instance: object, validated_data: Dict) -> object:
-        """Обновляет и возвращает существующий объект рецепта."""
+    @transaction.atomic
+    def update(self, instance: Recipe, validated_data: Dict) -> Recipe:
+        """Обновляет и возвращает существующий объект рецепта.
+
+        Теги заменяются одним set(), а ингредиенты сравниваются
+        с сохраненными и применяются одним bulk_create, одним
+        bulk_update и одним удалением, сколько бы их ни было.
+        """
         ingredients_data = validated_data.pop('ingredients')
         instance = super().update(instance, validated_data)
-
-        for ingredient_data in ingredients_data:
-            ingredient = ingredient_data.get('ingredient')
-            amount = ingredient_data.get('amount')
-            recipe_ingredient = instance.recipe_ingredients.get(
-                ingredient=ingredient
+        if 'image' in validated_data:
+            schedule_recipe_image(instance)
+
+        submitted = {
+            item['ingredient_id']: item['amount'] for item in ingredients_data
+        }
+        stored = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in instance.recipe_ingredients.all()
+        }
+        to_delete = [
+            recipe_ingredient.pk
+            for ingredient_id, recipe_ingredient in stored.items()
+            if ingredient_id not in submitted
+        ]
+        to_update = []
+        for ingredient_id, recipe_ingredient in stored.items():
+            amount = submitted.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                to_update.append(recipe_ingredient)
+        to_create = [
+            RecipeIngredient(
+                recipe=instance, ingredient_id=ingredient_id, amount=amount
             )
-            recipe_ingredient.amount = amount
-            recipe_ingredient.save()
+            for ingredient_id, amount in submitted.items()
+            if ingredient_id not in stored
+        ]
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ('amount',))
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        # Ранее подгруженные ингредиенты рецепта устарели.
+        getattr(instance, '_prefetched_objects_cache', {}).pop(
+            'recipe_ingredients', None
+        )
         return instance
 
-    def to_representation(self, instance: object) -> object:
+    def to_representation(self, instance: Recipe) -> Dict:
         """Возвращает представление объекта рецепта
         через RecipeReadSerializer сериалайзер."""
-        return RecipeReadSerializer(instance).data
+        prefetch_related_objects(
+            [instance], 'recipe_ingredients__ingredient', 'tags'
+        )
+        return RecipeReadSerializer(instance, context=self.context).data
 
 
 class CustomRecipeSerializer(serializers.ModelSerializer):
@@ -227,13 +398,12 @@ class SubscribeSerializer(serializers.ModelSerializer):
         source='following.last_name',
         read_only=True
     )
-    recipes = CustomRecipeSerializer(
-        source='following.recipes',
-        many=True,
+    recipes = serializers.SerializerMethodField()
+    is_subscribed = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(
+        source='following.recipes_count',
         read_only=True
     )
-    is_subscribed = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Subscribe
@@ -242,16 +412,23 @@ class SubscribeSerializer(serializers.ModelSerializer):
             'last_name', 'is_subscribed', 'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj: Subscribe) -> bool:
-        """Возвращает True, если подписка существует."""
-        if obj.user.is_authenticated:
-            return obj.user.follower.filter(
-                following=obj.following
-            ).exists()
-
-    def get_recipes_count(self, obj: Subscribe) -> Optional[int]:
-        """Возвращает количество рецептов у пользователя
-        на которого вы подписаны"""
-        return obj.following.recipes.count()
+        """Сериализуемая запись сама является подпиской."""
+        return True
+
+    def get_recipes(self, obj: Subscribe) -> List[Dict]:
+        """Возвращает последние рецепты автора, не больше recipes_limit.
+
+        Во вьюсете рецепты уже отобраны одним prefetch-запросом.
+        """
+        recipes = getattr(obj.following, 'limited_recipes', None)
+        if recipes is None:
+            recipes = obj.following.recipes.all()
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            if recipes_limit:
+                recipes = recipes[:recipes_limit]
+        return CustomRecipeSerializer(
+            recipes, many=True, context=self.context
+        ).data
 
 
 class SubscribeCreateSerializer(serializers.ModelSerializer):
@@ -279,3 +456,22 @@ class SubscribeCreateSerializer(serializers.ModelSerializer):
         return SubscribeSerializer(
             instance, context={'request': request}
         ).data
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Сериализатор фоновой задачи со ссылкой на готовый файл."""
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields: Tuple[str, ...] = (
+            'id', 'kind', 'status', 'attempts', 'error',
+            'created', 'updated', 'download_url'
+        )
+
+    def get_download_url(self, obj: Job) -> Optional[str]:
+        if obj.status != Job.Status.DONE or not obj.result:
+            return None
+        return self.context['request'].build_absolute_uri(
+            reverse('api:jobs-download', args=(obj.pk,))
+        )
@@ -0,0 +1,175 @@
+import csv
+import hashlib
+from functools import lru_cache
+from io import BytesIO
+from typing import IO, Dict, Iterable, Iterator, List, Tuple
+
+from django.conf import settings
+from django.db.models import QuerySet, Sum
+from django.http import HttpResponse
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import (Paragraph, SimpleDocTemplate, Spacer, Table,
+                                TableStyle)
+
+from api import constants
+from api.cache import CountingCache
+from recipes.models import RecipeIngredient
+from users.models import User
+
+pdf_cache = CountingCache(
+    'shopping_list_pdf', settings.SHOPPING_LIST_CACHE_ALIAS
+)
+
+
+def get_shopping_list(user: User) -> QuerySet:
+    """Суммирует ингредиенты из списка покупок одним GROUP BY запросом.
+
+    Группировка идет по id ингредиента, поэтому одноименные ингредиенты
+    с разными единицами измерения не складываются.
+    """
+    return RecipeIngredient.objects.filter(
+        recipe__shopping_carts__user=user
+    ).values(
+        'ingredient__id', 'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(
+        total_amount=Sum('amount')
+    ).order_by('ingredient__name', 'ingredient__id')
+
+
+class Echo:
+    """Буфер, который сразу отдает записанную строку csv.writer'у."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_text(items: Iterable[Dict]) -> Iterator[str]:
+    """Построчно отдает список покупок в текстовом виде."""
+    yield 'СПИСОК ПОКУПОК\n\n'
+    empty = True
+    for item in items:
+        empty = False
+        name = item['ingredient__name'].strip()
+        measurement_unit = item['ingredient__measurement_unit'].strip()
+        yield f"• {name} - {item['total_amount']}{measurement_unit}\n"
+    if empty:
+        yield 'СПИСОК ПОКУПОК ПУСТ.\n'
+
+
+def iter_csv(items: Iterable[Dict]) -> Iterator[str]:
+    """Построчно отдает список покупок в формате CSV."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in items:
+        yield writer.writerow((
+            item['ingredient__name'].strip(),
+            item['ingredient__measurement_unit'].strip(),
+            item['total_amount'],
+        ))
+
+
+@lru_cache(maxsize=None)
+def register_fonts() -> None:
+    """Регистрирует шрифты DejaVu один раз на процесс."""
+    pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
+    pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', 'DejaVuSans-Bold.ttf'))
+
+
+def get_cache_key(items: Iterable[Dict]) -> str:
+    """Ключ кэша PDF: хэш агрегированных строк списка покупок."""
+    digest = hashlib.sha256()
+    for item in items:
+        digest.update((
+            f"{item['ingredient__id']}\t{item['ingredient__name']}\t"
+            f"{item['ingredient__measurement_unit']}\t"
+            f"{item['total_amount']}\n"
+        ).encode())
+    return f'{constants.SHOPPING_LIST_PDF_CACHE_PREFIX}:{digest.hexdigest()}'
+
+
+def render_pdf(items: List[Dict]) -> Tuple[bytes, bool]:
+    """Берет PDF из кэша, а при промахе рендерит и кэширует его.
+
+    Возвращает содержимое файла и признак попадания в кэш.
+    """
+    key = get_cache_key(items)
+    content = pdf_cache.get(key)
+    if content is not None:
+        return content, True
+    output = BytesIO()
+    write_pdf(items, output)
+    content = output.getvalue()
+    pdf_cache.set(key, content)
+    return content, False
+
+
+def get_pdf_response(items: List[Dict]) -> HttpResponse:
+    """Отдает PDF списка покупок с заголовком X-Cache."""
+    content, hit = render_pdf(items)
+    response = HttpResponse(content, content_type='application/pdf')
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+def write_pdf(items: Iterable[Dict], output: IO[bytes]) -> None:
+    """Рендерит список покупок в PDF прямо в переданный файл."""
+    register_fonts()
+
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(
+        name='RussianStyle', fontName='DejaVuSans',
+        fontSize=constants.FONTSIZE_12, alignment=TA_LEFT,
+        spaceAfter=constants.SPACE, spaceBefore=constants.SPACE)
+    )
+
+    data: List[List[Paragraph]] = []
+    for item in items:
+        name = item['ingredient__name'].strip()
+        measurement_unit = item['ingredient__measurement_unit'].strip()
+        data.append(
+            [Paragraph(
+                f"• {name} - {item['total_amount']}{measurement_unit}",
+                styles['RussianStyle'])]
+        )
+    if not data:
+        data.append(
+            [Paragraph("СПИСОК ПОКУПОК ПУСТ.", styles['RussianStyle'])]
+        )
+    row_height = constants.ROW_HEIGHT
+    num_rows = len(data)
+    rowHeights = [row_height] * num_rows
+
+    table = Table(data, colWidths=500, rowHeights=rowHeights)
+    style = TableStyle([
+        ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
+        ('ALIGN', (0, 0), (-1, 0), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'DejaVuSans'),
+        ('TOPPADDING', (0, 0), (-1, 0), constants.TOPPADDING),
+        ('LINEABOVE', (0, 0), (-1, 0), constants.LINEABOVE, colors.green),
+    ])
+    table.setStyle(style)
+    doc = SimpleDocTemplate(output, pagesize=letter, bottomMargin=30)
+    story: List[Paragraph | Spacer | Table] = []
+    header_style = ParagraphStyle(
+        name='HeaderStyle', fontName='DejaVuSans-Bold', fontSize=16,
+        alignment=TA_CENTER, textColor=colors.black,
+        spaceAfter=constants.SPACE, spaceBefore=constants.SPACE
+    )
+    header_text = "СПИСОК ПОКУПОК"
+    header_paragraph = Paragraph(header_text, header_style)
+    story.append(header_paragraph)
+    story.append(Spacer(constants.SPACER_1, constants.SPACER_20))
+    story.append(table)
+    footer_style = ParagraphStyle(
+        name='FooterStyle', fontName='DejaVuSans', fontSize=14,
+        alignment=TA_CENTER, textColor=colors.black, )
+    footer_text = "<i>Приятного аппетита!</i>"
+    footer_paragraph = Paragraph(footer_text, footer_style)
+    story.append(Spacer(constants.SPACER_1, constants.SPACER_20))
+    story.append(footer_paragraph)
+    doc.build(story)
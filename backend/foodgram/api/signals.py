@@ -0,0 +1,179 @@
+from typing import FrozenSet, Optional, Set
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api import constants
+from api.counters import change_counters
+from api.feed import fan_out_recipe, on_subscribe, on_unsubscribe
+from api.ingredient_index import ingredient_index
+from api.jobs import enqueue
+from api.recipe_cache import invalidate_recipes
+from api.recipe_ingredient_index import index_updates
+from api.reference_cache import bump_version
+from api.search import schedule_search_update
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, Subscribe, Tag)
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs) -> None:
+    """Сбрасывает индекс автодополнения при изменении ингредиентов."""
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(**kwargs) -> None:
+    """Сбрасывает кэш ответов тегов после фиксации транзакции."""
+    transaction.on_commit(
+        lambda: bump_version(constants.REFERENCE_TAGS)
+    )
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(**kwargs) -> None:
+    """Сбрасывает кэш ответов ингредиентов после фиксации транзакции."""
+    transaction.on_commit(
+        lambda: bump_version(constants.REFERENCE_INGREDIENTS)
+    )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(instance: Recipe, **kwargs) -> None:
+    """Сбрасывает кэш представления рецепта при его изменении."""
+    invalidate_recipes([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=RecipeTag)
+def invalidate_recipe_relation(instance, **kwargs) -> None:
+    """Сбрасывает кэш рецепта при правке его ингредиентов и тегов."""
+    invalidate_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(
+        instance,
+        action: str,
+        reverse: bool,
+        pk_set: Optional[Set[int]],
+        **kwargs
+) -> None:
+    """Сбрасывает кэш рецептов, у которых поменялся набор тегов."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_recipes([instance.pk])
+    elif pk_set is not None:
+        invalidate_recipes(pk_set)
+    else:
+        invalidate_recipes(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search(instance: Recipe, **kwargs) -> None:
+    """Пересобирает поисковый документ сохраненного рецепта.
+
+    Документ строится после фиксации транзакции, когда ингредиенты,
+    записанные через bulk_create, уже в базе.
+    """
+    schedule_search_update([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def update_recipe_ingredients_search(
+        instance: RecipeIngredient,
+        **kwargs
+) -> None:
+    """Пересобирает документ рецепта при правке его ингредиентов."""
+    schedule_search_update([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search(
+        instance: Ingredient,
+        created: bool,
+        **kwargs
+) -> None:
+    """Ставит в очередь пересборку документов рецептов
+    с переименованным ингредиентом.
+
+    Рецептов с популярным ингредиентом могут быть сотни тысяч,
+    поэтому они обрабатываются задачей частями, а не в запросе.
+    """
+    if created:
+        return
+    enqueue(constants.JOB_INGREDIENT_SEARCH, ingredient_id=instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(instance: Recipe, created: bool, **kwargs) -> None:
+    """Раскладывает опубликованный рецепт по лентам подписчиков."""
+    if created:
+        fan_out_recipe(instance)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def update_recipe_ingredient_index(instance, sender, **kwargs) -> None:
+    """Обновляет индекс "ингредиент -> рецепты" после фиксации."""
+    index_updates.add(
+        [instance.pk if sender is Recipe else instance.recipe_id]
+    )
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Subscribe)
+def update_counters(instance, signal, created: bool = False, **kwargs) -> None:
+    """Меняет счетчики избранного, рецептов и подписок
+    в той же транзакции, что и запись."""
+    if signal is post_delete:
+        change_counters(instance, -1)
+    elif created:
+        change_counters(instance, 1)
+
+
+@receiver(post_save, sender=Subscribe)
+def fill_subscriber_feed(
+        instance: Subscribe,
+        created: bool,
+        **kwargs
+) -> None:
+    """Добавляет рецепты автора в ленту нового подписчика."""
+    if created:
+        on_subscribe(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def trim_subscriber_feed(instance: Subscribe, **kwargs) -> None:
+    """Убирает рецепты автора из ленты отписавшегося.
+
+    Ленты остальных подписчиков, если их нужно дозаполнить,
+    заполняются задачей, а не в запросе отписки.
+    """
+    if on_unsubscribe(instance.user_id, instance.following_id):
+        enqueue(
+            constants.JOB_FEED_BACKFILL, author_id=instance.following_id
+        )
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(
+        instance: User,
+        update_fields: Optional[FrozenSet[str]],
+        **kwargs
+) -> None:
+    """Сбрасывает кэш рецептов автора при правке его профиля.
+
+    Сохранения, не затронувшие поля автора в рецепте
+    (например, last_login при входе), пропускаются.
+    """
+    if update_fields and not (
+            update_fields & constants.RECIPE_AUTHOR_FIELDS):
+        return
+    invalidate_recipes(
+        Recipe.objects.filter(author=instance).values_list('pk', flat=True)
+    )
@@ -0,0 +1,80 @@
+import base64
+import binascii
+import uuid
+from io import BytesIO
+from typing import IO, Optional
+
+from django.conf import settings
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile,
+                                            UploadedFile)
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from api import constants
+
+
+def get_decoded_size(encoded: str) -> int:
+    """Размер данных после декодирования base64 без самого декодирования."""
+    return len(encoded) * 3 // 4 - encoded[-2:].count('=')
+
+
+def check_image_size(size: int) -> None:
+    """Проверяет ограничение на размер картинки рецепта."""
+    if size > settings.RECIPE_IMAGE_MAX_SIZE:
+        raise serializers.ValidationError(
+            f'Размер картинки не должен превышать '
+            f'{settings.RECIPE_IMAGE_MAX_SIZE} байт.'
+        )
+
+
+def decode_base64_image(data: str) -> UploadedFile:
+    """Декодирует data:image/...;base64 строку кусками в загруженный файл.
+
+    Размер проверяется до декодирования. Небольшие картинки остаются
+    в памяти, крупные пишутся во временный файл, как при multipart
+    загрузке, без полной копии декодированных байтов в памяти.
+    """
+    header, separator, encoded = data.partition(';base64,')
+    if not separator:
+        raise serializers.ValidationError('Некорректное изображение.')
+    content_type = header[len('data:'):]
+    name = f'{uuid.uuid4().hex}.{content_type.split("/")[-1]}'
+    size = get_decoded_size(encoded)
+    check_image_size(size)
+    if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        file = TemporaryUploadedFile(name, content_type, size, None)
+    else:
+        file = InMemoryUploadedFile(
+            BytesIO(), 'image', name, content_type, size, None
+        )
+    chunk_size = constants.BASE64_DECODE_CHUNK_SIZE
+    try:
+        for start in range(0, len(encoded), chunk_size):
+            file.write(base64.b64decode(
+                encoded[start:start + chunk_size], validate=True
+            ))
+    except (binascii.Error, ValueError):
+        file.close()
+        raise serializers.ValidationError('Некорректное изображение.')
+    file.seek(0)
+    return file
+
+
+def shrink_image(file: IO[bytes], max_dimension: int) -> Optional[bytes]:
+    """Уменьшает картинку до max_dimension пикселей по большей стороне.
+
+    Поворот из EXIF применяется к пикселям, формат файла сохраняется.
+    Возвращает None, если картинка не больше max_dimension или ее
+    формат не поддерживается.
+    """
+    with Image.open(file) as image:
+        image_format = image.format
+        if (max(image.size) <= max_dimension
+                or image_format not in constants.RECIPE_IMAGE_FORMATS):
+            return None
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension))
+        output = BytesIO()
+        image.save(output, format=image_format, optimize=True)
+    return output.getvalue()
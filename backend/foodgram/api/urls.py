@@ -1,7 +1,11 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
-from api.views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
+from api import constants
+from api.async_views import make_async_views
+from api.views import (CacheStatsViewSet, CustomUserViewSet, DbStatsViewSet,
+                       IngredientViewSet, JobViewSet, RecipeViewSet,
                        SubscribeViewSet, TagViewSet)
 
 app_name = 'api'
@@ -14,6 +18,9 @@ router_v1.register('users', CustomUserViewSet, basename='users')
 router_v1.register('tags', TagViewSet, basename='tags')
 router_v1.register('ingredients', IngredientViewSet, basename='ingredients')
 router_v1.register('recipes', RecipeViewSet, basename='recipes')
+router_v1.register('jobs', JobViewSet, basename='jobs')
+router_v1.register('cache-stats', CacheStatsViewSet, basename='cache-stats')
+router_v1.register('db-stats', DbStatsViewSet, basename='db-stats')
 
 urlpatterns = [
     path('users/<int:pk>/subscribe/', SubscribeViewSet.as_view(
@@ -27,3 +34,6 @@ urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
     path('', include(router_v1.urls)),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = make_async_views(urlpatterns, constants.ASYNC_READ_ROUTES)
@@ -1,31 +1,38 @@
-from typing import Optional, Tuple, Type
+from typing import Optional, Tuple, Type, Union
 
-from django.db.models import QuerySet
-from django.http import HttpRequest, HttpResponse
+from django.db.models import Exists, OuterRef, Prefetch, QuerySet, Subquery
+from django.http import (FileResponse, HttpRequest, HttpResponse,
+                         StreamingHttpResponse)
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.serializers import SetPasswordSerializer
 from djoser.views import UserViewSet
 from rest_framework import filters, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.filters import OrderingFilter, SearchFilter
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 
 from api import constants
-from api.actions import (download_shopping_cart, favorite, shopping_cart,
-                         subscribe, subscriptions)
-from api.filters import IngredientFilter, RecipeFilter
-from api.mixins import CreateList, ListRetrieve
-from api.pagination import CustomPagination
+from api.actions import (cook, download_shopping_cart, favorite, feed,
+                         shopping_cart, subscribe, subscriptions)
+from api.cache import registry
+from api.filters import IngredientFilter, RecipeFilter, filter_by_tags
+from api.ingredient_index import ingredient_index
+from api.mixins import ConditionalCacheMixin, CreateList, ListRetrieve
+from api.negotiation import IgnoreFormatContentNegotiation
+from api.pagination import (CustomPagination, KeysetPagination,
+                            LimitPageNumberPagination, get_recipes_limit)
 from api.permissions import IsAdminOrReadOnly, StaffAuthorOrReadOnly
-from api.serializers import (CustomRecipeSerializer,
-                             CustomUserCreateSerializer, CustomUserSerializer,
-                             IngredientReadSerializer, RecipeCreateSerializer,
-                             RecipeReadSerializer, SubscribeSerializer,
-                             TagSerializer)
-from recipes.models import Ingredient, Recipe, Subscribe, Tag
+from api.search import search_recipes
+from api.serializers import (CustomUserCreateSerializer, CustomUserSerializer,
+                             IngredientReadSerializer, JobSerializer,
+                             RecipeCreateSerializer, RecipeReadSerializer,
+                             SubscribeSerializer, TagSerializer)
+from foodgram.db.persistent import connection_stats
+from recipes.models import (Favorite, Ingredient, Job, Recipe, ShoppingCart,
+                            Subscribe, Tag)
 
 
 class CustomUserViewSet(UserViewSet):
@@ -50,8 +57,9 @@ class CustomUserViewSet(UserViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class TagViewSet(ListRetrieve):
+class TagViewSet(ConditionalCacheMixin, ListRetrieve):
     """Возвращает список тегов."""
+    reference_name = constants.REFERENCE_TAGS
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
@@ -60,8 +68,9 @@ class TagViewSet(ListRetrieve):
     pagination_class = CustomPagination
 
 
-class IngredientViewSet(ListRetrieve):
+class IngredientViewSet(ConditionalCacheMixin, ListRetrieve):
     """Возвращает список ингредиентов."""
+    reference_name = constants.REFERENCE_INGREDIENTS
     queryset = Ingredient.objects.all()
     serializer_class = IngredientReadSerializer
     permission_classes = (IsAdminOrReadOnly,)
@@ -71,6 +80,15 @@ class IngredientViewSet(ListRetrieve):
     http_method_names = ('get',)
     pagination_class = CustomPagination
 
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        """Поиск по названию отвечает из индекса в памяти без запроса
+        к базе, полный список отдается из кэша готовых ответов."""
+        query = (request.query_params.get('name')
+                 or request.query_params.get('search'))
+        if query:
+            return Response(ingredient_index.search(query))
+        return super().list(request, *args, **kwargs)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет для работы с рецептами."""
@@ -81,16 +99,52 @@ class RecipeViewSet(viewsets.ModelViewSet):
     http_method_names: Tuple[str, ...] = ('get', 'post', 'patch', 'delete',)
     permission_classes: Tuple = (StaffAuthorOrReadOnly,)
     pagination_class = PageNumberPagination
-    ordering_fields: Tuple[str, ...] = ('name',)
+    ordering_fields: Tuple[str, ...] = ('name', 'favorites_count')
+
+    @property
+    def paginator(self) -> Optional[BasePagination]:
+        """С параметром pagination=cursor отдает курсорные страницы."""
+        if KeysetPagination.is_requested(self.request):
+            self.pagination_class = KeysetPagination
+        return super().paginator
+
+    @property
+    def ordering(self) -> Optional[Tuple[str, ...]]:
+        """С параметром search рецепты сортируются по релевантности."""
+        if self.request.query_params.get('search'):
+            return constants.RECIPE_SEARCH_ORDERING
+        return None
 
     def get_queryset(self) -> QuerySet:
-        queryset = Recipe.objects.prefetch_related(
+        queryset = Recipe.objects.select_related('author').prefetch_related(
             'recipe_ingredients__ingredient', 'tags'
-        ).all()
+        )
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_author_subscribed=Exists(
+                    Subscribe.objects.filter(
+                        user=user, following=OuterRef('author')
+                    )
+                ),
+                is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+                ),
+                is_in_shopping_cart=Exists(
+                    ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef('pk')
+                    )
+                )
+            )
         tags = self.request.query_params.getlist('tags')
         if tags:
-            queryset = queryset.filter(tags__slug__in=tags)
-        return queryset.distinct()
+            queryset = filter_by_tags(
+                queryset, tags, self.request.query_params.get('tags_mode')
+            )
+        query = self.request.query_params.get('search')
+        if query:
+            queryset = search_recipes(queryset, query)
+        return queryset
 
     def get_serializer_class(self) -> Type:
         if self.action in constants.ACTION_METHODS:
@@ -100,38 +154,6 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer) -> None:
         serializer.save(author=self.request.user)
 
-    def _update_and_response(
-            self,
-            request: Request,
-            recipe: Recipe,
-            field_name: str,
-            error_message: str
-    ) -> Response:
-        if self.request.method == 'POST':
-            field_value = getattr(recipe, field_name)
-            if not field_value:
-                setattr(recipe, field_name, True)
-                recipe.save()
-                serializer = CustomRecipeSerializer(
-                    recipe,
-                    context={'request': request}
-                )
-                return Response(
-                    serializer.data, status=status.HTTP_201_CREATED
-                )
-            return Response(
-                {'detail': error_message},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        if getattr(recipe, field_name):
-            setattr(recipe, field_name, False)
-            recipe.save()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(
-            {'detail': error_message},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-
     @action(
         detail=True,
         methods=('POST', 'DELETE',),
@@ -153,7 +175,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=('GET',),
         permission_classes=(IsAuthenticated,)
     )
-    def download_shopping_cart(self, request: HttpRequest) -> HttpResponse:
+    def feed(self, request: Request) -> Response:
+        return feed(self, request)
+
+    @action(detail=False, methods=('GET',))
+    def cook(self, request: Request) -> Response:
+        return cook(self, request)
+
+    @action(
+        detail=False,
+        methods=('GET', 'POST'),
+        permission_classes=(IsAuthenticated,),
+        content_negotiation_class=IgnoreFormatContentNegotiation
+    )
+    def download_shopping_cart(
+            self,
+            request: HttpRequest
+    ) -> Union[HttpResponse, StreamingHttpResponse]:
         return download_shopping_cart(self, request)
 
 
@@ -162,13 +200,35 @@ class SubscribeViewSet(CreateList):
     queryset = Subscribe.objects.all()
     serializer_class = SubscribeSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = LimitPageNumberPagination
     filter_backends = (filters.SearchFilter,)
     search_fields = ('following__username',)
 
     def get_queryset(self) -> QuerySet:
         """Переопределение метода get_queryset
-        для запроса фолловеров по username."""
-        return self.queryset.filter(user=self.request.user)
+        для запроса фолловеров по username.
+
+        Количество рецептов берется из счетчика автора, а последние
+        recipes_limit рецептов всех авторов страницы выбираются
+        одним prefetch-запросом.
+        """
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        recipes_limit = get_recipes_limit(self.request)
+        if recipes_limit:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-pub_date', '-id').values('pk')[:recipes_limit]
+            ))
+        return self.queryset.filter(
+            user=self.request.user
+        ).select_related('following').prefetch_related(
+            Prefetch(
+                'following__recipes',
+                queryset=recipes,
+                to_attr='limited_recipes'
+            )
+        ).order_by('-id')
 
     def perform_create(self, serializer) -> None:
         """Переопределение метода perform_create
@@ -186,3 +246,51 @@ class SubscribeViewSet(CreateList):
             pk: Optional[int] = None
     ) -> Response:
         return subscribe(self, request, pk=pk)
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Фоновые задачи пользователя: статус и скачивание результата."""
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = LimitPageNumberPagination
+
+    def get_queryset(self) -> QuerySet:
+        return Job.objects.filter(user=self.request.user)
+
+    @action(detail=True, methods=('GET',))
+    def download(
+            self,
+            request: Request,
+            pk: Optional[int] = None
+    ) -> Union[FileResponse, Response]:
+        job = self.get_object()
+        if job.status != Job.Status.DONE or not job.result:
+            return Response(
+                {'detail': 'Результат задачи еще не готов.',
+                 'status': job.status},
+                status=status.HTTP_409_CONFLICT
+            )
+        return FileResponse(
+            job.result.open('rb'),
+            as_attachment=True,
+            filename=job.filename,
+            content_type=job.content_type
+        )
+
+
+class CacheStatsViewSet(viewsets.ViewSet):
+    """Счетчики попаданий в кэши текущего процесса."""
+    permission_classes = (IsAdminUser,)
+
+    def list(self, request: Request) -> Response:
+        return Response(
+            {name: cache.stats() for name, cache in registry.items()}
+        )
+
+
+class DbStatsViewSet(viewsets.ViewSet):
+    """Счетчики соединений с базой текущего процесса."""
+    permission_classes = (IsAdminUser,)
+
+    def list(self, request: Request) -> Response:
+        return Response(connection_stats.stats())
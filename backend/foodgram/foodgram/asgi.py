@@ -12,5 +12,13 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+# Под ASGI чтение идет через асинхронные view, см. api/async_views.py.
+os.environ.setdefault('ASYNC_READ_VIEWS', 'true')
 
 application = get_asgi_application()
+
+from api.ingredient_index import ingredient_index  # noqa: E402
+from api.recipe_ingredient_index import recipe_ingredient_index  # noqa: E402
+
+ingredient_index.warm_up()
+recipe_ingredient_index.warm_up()
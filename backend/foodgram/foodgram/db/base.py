@@ -0,0 +1,7 @@
+from django.db.backends.postgresql import base
+
+from foodgram.db.persistent import PersistentConnectionMixin
+
+
+class DatabaseWrapper(PersistentConnectionMixin, base.DatabaseWrapper):
+    """PostgreSQL с постоянными соединениями и их проверкой."""
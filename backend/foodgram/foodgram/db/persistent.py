@@ -0,0 +1,71 @@
+import os
+from threading import Lock
+from typing import Any, Dict
+
+
+class ConnectionStats:
+    """Счетчики соединений с базой в пределах процесса (воркера)."""
+
+    def __init__(self) -> None:
+        self.opened = 0
+        self.reused = 0
+        self.failed = 0
+        self._lock = Lock()
+
+    def increment(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики и долю запросов без нового соединения."""
+        total = self.opened + self.reused
+        return {
+            'pid': os.getpid(),
+            'opened': self.opened,
+            'reused': self.reused,
+            'failed': self.failed,
+            'reuse_rate': round(self.reused / total, 4) if total else None,
+        }
+
+
+connection_stats = ConnectionStats()
+
+
+class PersistentConnectionMixin:
+    """Переиспользование соединений с проверкой живости.
+
+    Соединение живет CONN_MAX_AGE секунд. При CONN_HEALTH_CHECKS
+    перед первым запросом в каждом HTTP-запросе соединение проверяется
+    и при обрыве открывается заново, как в Django 4.1.
+    """
+
+    health_check_done = False
+
+    def connect(self) -> None:
+        try:
+            super().connect()
+        except self.Database.Error:
+            connection_stats.increment('failed')
+            raise
+        connection_stats.increment('opened')
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self) -> None:
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self) -> None:
+        """Проверяет сохраненное соединение при первом использовании."""
+        if self.connection is None or self.health_check_done:
+            return
+        self.health_check_done = True
+        if (self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not self.is_usable()):
+            connection_stats.increment('failed')
+            self.close()
+            return
+        connection_stats.increment('reused')
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
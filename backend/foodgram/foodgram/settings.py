@@ -30,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,14 +60,117 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shopping_list': {
+        'BACKEND': os.getenv(
+            'SHOPPING_LIST_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('SHOPPING_LIST_CACHE_LOCATION', 'shopping-list'),
+        'TIMEOUT': int(os.getenv('SHOPPING_LIST_CACHE_TIMEOUT', 60 * 60 * 24)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('SHOPPING_LIST_CACHE_MAX_ENTRIES', 256)
+            ),
+        },
+    },
+    # Готовые ответы справочников тегов и ингредиентов. В ключ входит
+    # версия справочника из базы, поэтому его изменение в любом процессе
+    # сразу видно всем воркерам, и с locmem.
+    'reference': {
+        'BACKEND': os.getenv(
+            'REFERENCE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('REFERENCE_CACHE_LOCATION', 'reference'),
+        'TIMEOUT': int(os.getenv('REFERENCE_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('REFERENCE_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+    # Готовые представления рецептов без персональных флагов.
+    # LocMemCache вытесняет давно не читанные записи сверх MAX_ENTRIES.
+    # Запись сверяется с Recipe.updated, поэтому правка рецепта в другом
+    # воркере видна сразу и с locmem. Правки ингредиентов и тегов рецепта
+    # в обход его сохранения сбрасывают кэш только в своем процессе,
+    # для нескольких воркеров тогда нужен общий бэкенд (Redis, Memcached).
+    'recipe_fragments': {
+        'BACKEND': os.getenv(
+            'RECIPE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('RECIPE_CACHE_LOCATION', 'recipe-fragments'),
+        'TIMEOUT': int(os.getenv('RECIPE_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('RECIPE_CACHE_MAX_ENTRIES', 5000)),
+        },
+    },
+}
+SHOPPING_LIST_CACHE_ALIAS = 'shopping_list'
+REFERENCE_CACHE_ALIAS = 'reference'
+RECIPE_CACHE_ALIAS = 'recipe_fragments'
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+# Рецепты авторов с большим числом подписчиков не раскладываются
+# по лентам при публикации, а дочитываются из рецептов при чтении ленты.
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', 1000))
+# Как часто индекс "ингредиент -> рецепты" перечитывается из базы.
+RECIPE_INGREDIENT_INDEX_TTL = int(
+    os.getenv('RECIPE_INGREDIENT_INDEX_TTL', 600)
+)
+# Под ASGI чтение рецептов, тегов, ингредиентов и подписок идет
+# в пуле из ASYNC_READ_THREADS потоков, каждый держит свое соединение.
+ASYNC_READ_VIEWS = os.getenv(
+    'ASYNC_READ_VIEWS', default='false'
+).lower() == 'true'
+ASYNC_READ_THREADS = int(os.getenv('ASYNC_READ_THREADS', 16))
+# Задача, которую воркер не закончил за JOBS_LOCK_TIMEOUT секунд,
+# считается брошенной и снова забирается из очереди.
+JOBS_LOCK_TIMEOUT = int(os.getenv('JOBS_LOCK_TIMEOUT', 600))
+# Сколько секунд хранятся завершенные задачи и их файлы.
+JOBS_RESULT_TTL = int(os.getenv('JOBS_RESULT_TTL', 60 * 60 * 24))
+
+# Доля запросов к API, для которых пишутся метрики, от 0 до 1.
+PERFORMANCE_SAMPLE_RATE = float(os.getenv('PERFORMANCE_SAMPLE_RATE', 0))
+# Сколько одинаковых запросов за один HTTP-запрос считать N+1.
+PERFORMANCE_N_PLUS_ONE_THRESHOLD = int(
+    os.getenv('PERFORMANCE_N_PLUS_ONE_THRESHOLD', 5)
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'foodgram.performance': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'foodgram.db',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Время жизни соединения в секундах, 0 - закрывать после запроса.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', default='true'
+        ).lower() == 'true',
+        # pgbouncer в режиме transaction не держит серверные курсоры.
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_PGBOUNCER_TRANSACTION_MODE', default='false'
+        ).lower() == 'true',
     }
 }
 
@@ -106,6 +210,19 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Загрузки крупнее этого размера пишутся во временный файл, а не в память.
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(
+    os.getenv('FILE_UPLOAD_MAX_MEMORY_SIZE', 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+)
+# Картинки рецептов больше этого размера в пикселях по большей стороне
+# уменьшаются фоновой задачей, 0 - не уменьшать.
+RECIPE_IMAGE_MAX_DIMENSION = int(
+    os.getenv('RECIPE_IMAGE_MAX_DIMENSION', 2048)
+)
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
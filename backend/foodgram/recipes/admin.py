@@ -1,46 +1,228 @@
-from typing import Tuple
+from typing import Optional, Tuple
 
+from django import forms
 from django.contrib import admin
-
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Subscribe, Tag
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.db.models import Count, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from django.http import HttpRequest
+from django.utils.functional import cached_property
+
+from api import constants
+from recipes.models import (Favorite, Ingredient, Job, Recipe,
+                            RecipeIngredient, RecipeTag, ShoppingCart,
+                            Subscribe, Tag)
 from users.models import User
 
 
-class RecipeIngredientInline(admin.TabularInline):
-    model = RecipeIngredient
+def estimate_count(queryset: QuerySet) -> Optional[int]:
+    """Оценка числа строк по статистике PostgreSQL.
+
+    Без фильтров берется reltuples таблицы, с фильтрами - число строк
+    из плана запроса. Для других баз оценки нет.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+        else:
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    if isinstance(row[0], list):
+        return row[0][0]['Plan']['Plan Rows']
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который не считает COUNT(*) по большим таблицам.
+
+    Точное число строк считается, только если оценка меньше
+    ADMIN_EXACT_COUNT_LIMIT.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < constants.ADMIN_EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Общие настройки списков для таблиц с миллионами строк."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class LoadedAutocompleteSelect(AutocompleteSelect):
+    """AutocompleteSelect, который берет подпись выбранного объекта
+    у уже загруженного instance формы, а не отдельным запросом."""
+    loaded: Optional[models.Model] = None
+
+    def optgroups(self, name, value, attr=None):
+        loaded = self.loaded
+        if loaded is None or list(map(str, value)) != [str(loaded.pk)]:
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        options.append(self.create_option(
+            name, loaded.pk, self.choices.field.label_from_instance(loaded),
+            True, len(options)
+        ))
+        return [(None, options, 0)]
+
+
+class LoadedRelationsForm(forms.ModelForm):
+    """Передает виджетам LoadedAutocompleteSelect связанные объекты,
+    подгруженные в queryset инлайна через select_related."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, field in self.fields.items():
+            widget = getattr(field.widget, 'widget', field.widget)
+            if not isinstance(widget, LoadedAutocompleteSelect):
+                continue
+            model_field = self.instance._meta.get_field(name)
+            if model_field.is_cached(self.instance):
+                widget.loaded = getattr(self.instance, name)
+
+
+class LoadedRelationsInline(admin.TabularInline):
+    """Инлайн, страница которого не делает запрос на каждую строку
+    ради подписей в полях автодополнения."""
+    form = LoadedRelationsForm
     extra = 0
+    # Сортировка модели по recipe__name добавила бы JOIN.
+    ordering: Tuple = ('id',)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs.setdefault('widget', LoadedAutocompleteSelect(
+                db_field, self.admin_site, using=kwargs.get('using')
+            ))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class RecipeIngredientInline(LoadedRelationsInline):
+    model = RecipeIngredient
+    autocomplete_fields: Tuple = ('ingredient',)
+
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        return super().get_queryset(request).select_related(
+            'recipe', 'ingredient'
+        )
+
+
+class RecipeTagInline(LoadedRelationsInline):
+    model = RecipeTag
+    autocomplete_fields: Tuple = ('tag',)
+
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        return super().get_queryset(request).select_related('recipe', 'tag')
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
-    pass
+    list_display: Tuple = ('name', 'slug', 'color')
+    search_fields: Tuple = ('name', 'slug')
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
-    pass
+    list_display: Tuple = ('name', 'measurement_unit')
+    search_fields: Tuple = ('^name',)
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
-    inlines: Tuple = (RecipeIngredientInline,)
-    list_filter: Tuple = ('pub_date', 'name', 'author', 'tags')
-    list_display: Tuple = ('name', 'author', 'total_favorites')
-    search_fields: Tuple = ('name', 'author', 'tags')
-    ordering: Tuple = ('name',)
-
-    def total_favorites(self, obj):
-        return Recipe.objects.filter(is_favorited=True).count()
-
-    total_favorites.short_description = 'В избранном'
+class RecipeAdmin(LargeTableAdmin):
+    inlines: Tuple = (RecipeIngredientInline, RecipeTagInline)
+    list_filter: Tuple = ('tags',)
+    list_display: Tuple = (
+        'name', 'author', 'pub_date', 'favorites_count', 'ingredients_count'
+    )
+    list_select_related: Tuple = ('author',)
+    date_hierarchy = 'pub_date'
+    search_fields: Tuple = ('name', '=author__username')
+    autocomplete_fields: Tuple = ('author',)
+    ordering: Tuple = ('-pub_date', '-id')
+
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        """Число ингредиентов считается подзапросом для строк страницы."""
+        return super().get_queryset(request).annotate(
+            ingredients_total=Coalesce(
+                Subquery(
+                    RecipeIngredient.objects.filter(
+                        recipe=OuterRef('pk')
+                    ).order_by().values('recipe').annotate(
+                        total=Count('id')
+                    ).values('total')
+                ),
+                0
+            )
+        )
+
+    @admin.display(description='Ингредиентов', ordering='ingredients_total')
+    def ingredients_count(self, obj: Recipe) -> int:
+        return obj.ingredients_total
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
-    list_display: Tuple = ('username', 'email',)
+class UserAdmin(LargeTableAdmin):
+    list_display: Tuple = (
+        'username', 'email', 'recipes_count', 'followers_count',
+        'following_count'
+    )
     search_fields: Tuple = ('username', 'email',)
+    ordering: Tuple = ('-id',)
+
+
+class UserRecipeAdmin(LargeTableAdmin):
+    list_display: Tuple = ('user', 'recipe')
+    list_select_related: Tuple = ('user', 'recipe')
+    search_fields: Tuple = ('=user__username',)
+    autocomplete_fields: Tuple = ('user', 'recipe')
+    ordering: Tuple = ('-id',)
 
 
 @admin.register(Subscribe)
-class SubscribeAdmin(admin.ModelAdmin):
+class SubscribeAdmin(LargeTableAdmin):
+    list_display: Tuple = ('user', 'following')
+    list_select_related: Tuple = ('user', 'following')
+    search_fields: Tuple = ('=user__username', '=following__username')
+    autocomplete_fields: Tuple = ('user', 'following')
+    ordering: Tuple = ('-id',)
+
+
+@admin.register(Favorite)
+class FavoriteAdmin(UserRecipeAdmin):
     pass
+
+
+@admin.register(ShoppingCart)
+class ShoppingCartAdmin(UserRecipeAdmin):
+    pass
+
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display: Tuple = (
+        'id', 'kind', 'status', 'user', 'attempts', 'run_after', 'updated'
+    )
+    list_filter: Tuple = ('status', 'kind')
+    list_select_related: Tuple = ('user',)
+    search_fields: Tuple = ('=user__username',)
+    autocomplete_fields: Tuple = ('user',)
+    readonly_fields: Tuple = ('locked_at', 'created', 'updated')
+    ordering: Tuple = ('-id',)
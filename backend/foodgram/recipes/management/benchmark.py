@@ -0,0 +1,53 @@
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+
+class QueryCounter:
+    """Считает SQL-запросы, выполненные внутри connection.execute_wrapper."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Выполняет func repeat раз и возвращает перцентили времени
+    в миллисекундах и число запросов за один вызов.
+
+    queries - наибольшее число запросов среди повторов: первый
+    вызов обычно идет с холодным кэшем, и его запросы не должны
+    теряться за более дешевыми повторами. queries_last - число
+    запросов последнего, прогретого вызова.
+    """
+    from django.db import connection
+
+    timings: List[float] = []
+    counts: List[int] = []
+    for _ in range(repeat):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        counts.append(counter.count)
+    return {
+        'queries': max(counts),
+        'queries_last': counts[-1],
+        **percentiles(timings),
+    }
+
+
+def percentiles(timings: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 по списку замеров."""
+    if len(timings) < 2:
+        timings = timings * 2
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return {
+        'p50': round(statistics.median(timings), 3),
+        'p95': round(cuts[94], 3),
+        'p99': round(cuts[98], 3),
+    }
@@ -0,0 +1,326 @@
+import base64
+import json
+import random
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api.counters import reconcile_counters
+from api.feed import fill_feeds
+from api.search import update_search_documents
+from recipes.management.benchmark import measure
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Subscribe, Tag)
+from users.models import User
+
+# Максимум SQL-запросов на один запрос к эндпоинту. Превышение
+# означает регрессию в api/views.py или api/serializers.py.
+# Считается худший из повторов: первый идет с холодным кэшем,
+# после каждого выполняются on_commit-обработчики. Бюджеты чтения
+# равны замеру на SQLite: их число запросов не зависит от данных,
+# и любой лишний запрос - регрессия. У записи запас в 2 запроса:
+# их число зависит от того, какие теги и ингредиенты поменялись.
+# В PostgreSQL запросов меньше на BEGIN, которые шлет только SQLite.
+QUERY_BUDGETS: Dict[str, int] = {
+    'recipe_list': 6,
+    # Страница из 50 рецептов разных авторов: подписка на автора
+    # берется из аннотации запроса, а не запросом на каждого автора.
+    'recipe_list_authors': 5,
+    'recipe_list_tags': 6,
+    'recipe_list_favorited': 6,
+    'recipe_list_cursor': 5,
+    'recipe_search': 6,
+    'recipe_feed': 6,
+    'recipe_detail': 5,
+    'recipe_create': 28,
+    'recipe_update': 30,
+    'subscriptions': 3,
+    'ingredient_search': 1,
+    'shopping_cart_download': 1,
+    'shopping_cart_enqueue': 1,
+}
+IMAGE = 'data:image/png;base64,' + base64.b64encode(
+    (Path(settings.MEDIA_ROOT) / 'recipes' / 'images' / 'temp.png')
+    .read_bytes()
+).decode()
+
+
+def committed(func: Callable) -> Callable:
+    """func, после которой выполняются ее on_commit-обработчики.
+
+    Замер идет в транзакции, которая затем откатывается, и без этого
+    пересборка поиска, сброс кэшей и обновление индексов не попали бы
+    в счетчик запросов.
+    """
+    def run() -> None:
+        with TestCase.captureOnCommitCallbacks(execute=True):
+            func()
+    return run
+
+
+class Command(BaseCommand):
+    help = ('Замер горячих эндпоинтов API на сгенерированных данных '
+            'с проверкой бюджета SQL-запросов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=50,
+            help='Количество пользователей'
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=1000,
+            help='Количество рецептов'
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=500,
+            help='Количество ингредиентов'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=30,
+            help='Количество повторов каждого замера'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Зерно генератора данных'
+        )
+        parser.add_argument(
+            '--output', default='benchmark_api.json',
+            help='Файл, в который пишутся результаты в JSON'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        cache_settings = {
+            alias: {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': f'benchmark-{alias}',
+                'OPTIONS': config.get('OPTIONS', {}),
+            }
+            for alias, config in settings.CACHES.items()
+        }
+        created_images: List[str] = []
+        with override_settings(
+                ALLOWED_HOSTS=['testserver'], CACHES=cache_settings):
+            with transaction.atomic():
+                with TestCase.captureOnCommitCallbacks(execute=True):
+                    user, recipe = self._seed(options)
+                client = APIClient()
+                client.force_authenticate(user)
+                results = {}
+                for name, func in self._endpoints(client, user, recipe):
+                    # Первый повтор каждого замера идет с холодным кэшем.
+                    for cache in caches.all():
+                        cache.clear()
+                    results[name] = {
+                        **measure(committed(func), options['repeat']),
+                        'budget': QUERY_BUDGETS[name],
+                    }
+                created_images = list(
+                    Recipe.objects.filter(
+                        name__startswith='benchmark create'
+                    ).values_list('image', flat=True)
+                )
+                transaction.set_rollback(True)
+        for image in created_images:
+            default_storage.delete(image)
+
+        report = {
+            'database': connection.vendor,
+            'dataset': {
+                name: options[name]
+                for name in ('users', 'recipes', 'ingredients', 'seed')
+            },
+            'repeat': options['repeat'],
+            'endpoints': results,
+        }
+        Path(options['output']).write_text(
+            json.dumps(report, indent=2, ensure_ascii=False)
+        )
+        over_budget = []
+        for name, result in results.items():
+            exceeded = result['queries'] > result['budget']
+            if exceeded:
+                over_budget.append(name)
+            self.stdout.write(
+                f"{name}: queries={result['queries']}/{result['budget']} "
+                f"(last {result['queries_last']}) "
+                f"p50={result['p50']:.2f}ms p95={result['p95']:.2f}ms "
+                f"p99={result['p99']:.2f}ms"
+                + (' OVER BUDGET' if exceeded else '')
+            )
+        self.stdout.write(f"Результаты записаны в {options['output']}")
+        if over_budget:
+            raise CommandError(
+                'Превышен бюджет запросов: ' + ', '.join(over_budget)
+            )
+
+    def _endpoints(
+            self,
+            client: APIClient,
+            user: User,
+            recipe: Recipe
+    ) -> List[Tuple[str, Callable]]:
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)[:6]
+        )
+        tag_ids = list(Tag.objects.values_list('id', flat=True)[:2])
+        ingredient_name = Ingredient.objects.first().name[:3]
+        update_payloads = [
+            {
+                'tags': tag_ids[:1 + number % 2],
+                'ingredients': [
+                    {'id': ingredient_id, 'amount': number + 1}
+                    for ingredient_id in ingredient_ids[number % 2:]
+                ],
+            }
+            for number in range(2)
+        ]
+        counter = iter(range(10 ** 9))
+
+        def get(url: str) -> Callable:
+            return lambda: self._check(client.get(url), 200)
+
+        def create() -> None:
+            self._check(client.post('/api/recipes/', {
+                'ingredients': [
+                    {'id': ingredient_id, 'amount': 10}
+                    for ingredient_id in ingredient_ids
+                ],
+                'tags': tag_ids,
+                'name': f'benchmark create {next(counter)}',
+                'text': 'benchmark',
+                'image': IMAGE,
+                'cooking_time': 10,
+            }, format='json'), 201)
+
+        def update() -> None:
+            payload = update_payloads[next(counter) % 2]
+            self._check(client.patch(
+                f'/api/recipes/{recipe.pk}/', payload, format='json'
+            ), 200)
+
+        def download() -> None:
+            response = self._check(client.get(
+                '/api/recipes/download_shopping_cart/?format=txt'
+            ), 200)
+            b''.join(response.streaming_content)
+
+        def enqueue() -> None:
+            self._check(client.post(
+                '/api/recipes/download_shopping_cart/'
+            ), 202)
+
+        return [
+            ('recipe_list', get('/api/recipes/')),
+            ('recipe_list_authors', get(
+                '/api/recipes/?pagination=cursor&limit=50'
+            )),
+            ('recipe_list_tags', get(
+                '/api/recipes/?' + '&'.join(f'tags={tag}' for tag in tags)
+            )),
+            ('recipe_list_favorited', get('/api/recipes/?is_favorited=1')),
+            ('recipe_list_cursor', get(
+                '/api/recipes/?pagination=cursor&limit=20'
+            )),
+            ('recipe_search', get('/api/recipes/?search=recipe%2012')),
+            ('recipe_feed', get('/api/recipes/feed/?limit=20')),
+            ('recipe_detail', get(f'/api/recipes/{recipe.pk}/')),
+            ('recipe_create', create),
+            ('recipe_update', update),
+            ('subscriptions', get(
+                '/api/users/subscriptions/?recipes_limit=3'
+            )),
+            ('ingredient_search', get(
+                f'/api/ingredients/?name={ingredient_name}'
+            )),
+            ('shopping_cart_download', download),
+            ('shopping_cart_enqueue', enqueue),
+        ]
+
+    @staticmethod
+    def _check(response, status: int):
+        if response.status_code != status:
+            raise CommandError(
+                f'{response.request["PATH_INFO"]} ответил '
+                f'{response.status_code} вместо {status}'
+            )
+        return response
+
+    def _seed(self, options: Dict) -> Tuple[User, Recipe]:
+        """Создает пользователей, теги, ингредиенты и рецепты
+        с избранным, подписками и корзиной."""
+        rnd = self.random
+        User.objects.bulk_create(
+            User(
+                username=f'benchmark_{i}',
+                email=f'benchmark_{i}@example.com',
+                first_name='Benchmark',
+                last_name=str(i),
+            )
+            for i in range(options['users'])
+        )
+        Tag.objects.bulk_create(
+            Tag(name=f'Benchmark {i}', slug=f'benchmark-{i}', color='#E26C2D')
+            for i in range(6)
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'benchmark {i}', measurement_unit='г')
+            for i in range(options['ingredients'])
+        )
+        # SQLite не возвращает первичные ключи из bulk_create.
+        users = list(User.objects.filter(username__startswith='benchmark_'))
+        tags = list(Tag.objects.filter(slug__startswith='benchmark-'))
+        ingredients = list(
+            Ingredient.objects.filter(name__startswith='benchmark ')
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=rnd.choice(users),
+                name=f'benchmark recipe {i}',
+                text='benchmark ' * 50,
+                cooking_time=rnd.randint(1, 120),
+                image='recipes/images/temp.png',
+            )
+            for i in range(options['recipes'])
+        )
+        recipes = list(Recipe.objects.filter(author__in=users))
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in rnd.sample(tags, rnd.randint(1, 3))
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient=ingredient,
+                amount=rnd.randint(1, 500)
+            )
+            for recipe in recipes
+            for ingredient in rnd.sample(ingredients, rnd.randint(3, 12))
+        )
+        update_search_documents(recipe.pk for recipe in recipes)
+        user = users[0]
+        Favorite.objects.bulk_create(
+            Favorite(user=user, recipe=recipe)
+            for recipe in rnd.sample(recipes, min(len(recipes), 50))
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe)
+            for recipe in rnd.sample(recipes, min(len(recipes), 20))
+        )
+        Subscribe.objects.bulk_create(
+            Subscribe(user=user, following=author)
+            for author in rnd.sample(users[1:], min(len(users) - 1, 10))
+        )
+        fill_feeds([user.pk])
+        reconcile_counters()
+        recipe = next(recipe for recipe in recipes if recipe.author == user)
+        return user, recipe
@@ -0,0 +1,144 @@
+import random
+from itertools import accumulate
+from typing import List, Set, Tuple
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from api.recipe_ingredient_index import RecipeIngredientIndex
+from recipes.management.benchmark import measure
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from users.models import User
+
+
+def sql_matches(
+        ingredient_ids: List[int], max_missing: int
+) -> List[Tuple[int, int, int]]:
+    """Подбор рецептов группировкой связей рецепт-ингредиент в базе."""
+    rows = RecipeIngredient.objects.order_by().values('recipe').annotate(
+        total=Count('id'),
+        matched=Count('id', filter=Q(ingredient__in=ingredient_ids)),
+    ).filter(
+        matched__gte=1, total__lte=F('matched') + max_missing
+    ).order_by(F('total') - F('matched'), '-matched', '-recipe_id')
+    return [
+        (row['recipe'], row['matched'], row['total'] - row['matched'])
+        for row in rows
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Сравнение подбора рецептов по имеющимся ингредиентам '
+            'запросом к базе и по индексу в памяти')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=20000,
+            help='Количество рецептов'
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Количество ингредиентов'
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='Количество ингредиентов в каждом рецепте'
+        )
+        parser.add_argument(
+            '--have', type=int, default=15,
+            help='Количество имеющихся ингредиентов в запросе'
+        )
+        parser.add_argument(
+            '--missing', type=int, default=2,
+            help='Сколько ингредиентов может не хватать'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=10,
+            help='Количество повторов каждого замера'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            ingredients = self._fill(rng, options)
+            # Запрашиваются популярные ингредиенты, как в реальной кухне.
+            have = ingredients[:options['have']]
+            index = RecipeIngredientIndex()
+            build = measure(index.build, 1)
+            self.stdout.write(f"index build: {build['p50']:.2f}ms")
+            expected = sql_matches(have, options['missing'])
+            found = index.search(have, options['missing'])
+            if expected != found[:len(found)]:
+                self.stderr.write('Результаты индекса и базы расходятся')
+            for label, func in (
+                    ('sql', lambda: sql_matches(have, options['missing'])),
+                    ('index', lambda: index.search(
+                        have, options['missing'])[:20]),
+            ):
+                result = measure(func, options['repeat'])
+                self.stdout.write(
+                    f"recipes={options['recipes']} "
+                    f"matches={len(expected)} {label}: "
+                    f"queries={result['queries']} "
+                    f"median={result['p50']:.2f}ms p95={result['p95']:.2f}ms"
+                )
+            transaction.set_rollback(True)
+
+    def _fill(self, rng: random.Random, options) -> List[int]:
+        """Создает рецепты со степенным распределением популярности
+        ингредиентов и возвращает id ингредиентов от частых к редким."""
+        user = User.objects.create(
+            username='benchmark_cook', email='benchmark_cook@example.com'
+        )
+        prefix = 'benchmark cook '
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'{prefix}{i}', measurement_unit='г')
+            for i in range(options['ingredients'])
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=user,
+                name=f'benchmark {i}',
+                text='benchmark',
+                cooking_time=1,
+                image='recipes/images/temp.png',
+            )
+            for i in range(options['recipes'])
+        )
+        # SQLite не возвращает первичные ключи из bulk_create.
+        ingredients = list(
+            Ingredient.objects.filter(
+                name__startswith=prefix
+            ).order_by('id').values_list('id', flat=True)
+        )
+        weights = list(accumulate(
+            1 / (rank + 1) for rank in range(len(ingredients))
+        ))
+        per_recipe = min(options['ingredients_per_recipe'], len(ingredients))
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id, amount=1
+                )
+                for recipe_id in Recipe.objects.filter(
+                    author=user
+                ).values_list('id', flat=True)
+                for ingredient_id in self._sample(
+                    rng, ingredients, weights, per_recipe
+                )
+            ),
+            batch_size=5000
+        )
+        return ingredients
+
+    @staticmethod
+    def _sample(
+            rng: random.Random, population: List[int],
+            cum_weights: List[float], size: int
+    ) -> Set[int]:
+        chosen: Set[int] = set()
+        while len(chosen) < size:
+            chosen.add(rng.choices(population, cum_weights=cum_weights)[0])
+        return chosen
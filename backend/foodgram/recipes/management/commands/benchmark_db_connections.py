@@ -0,0 +1,78 @@
+from typing import Dict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from foodgram.db.persistent import connection_stats
+from recipes.management.benchmark import measure
+
+
+class Command(BaseCommand):
+    help = ('Задержка запросов к API с новым соединением на каждый '
+            'запрос и с переиспользованием соединения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default='/api/recipes/',
+            help='Адрес, который запрашивается в замерах'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Количество запросов в каждом замере'
+        )
+        parser.add_argument(
+            '--max-age', type=int, default=60,
+            help='CONN_MAX_AGE для замера с переиспользованием'
+        )
+
+    def handle(self, *args, **options):
+        wrapper = connections[DEFAULT_DB_ALIAS]
+        max_age = wrapper.settings_dict['CONN_MAX_AGE']
+        client = Client()
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                for label, conn_max_age in (
+                        ('new connection', 0),
+                        ('reused', options['max_age']),
+                ):
+                    wrapper.settings_dict['CONN_MAX_AGE'] = conn_max_age
+                    wrapper.close()
+                    before = connection_stats.stats()
+                    result = measure(
+                        lambda: self._request(client, options['url']),
+                        options['requests']
+                    )
+                    counters = self._delta(before, connection_stats.stats())
+                    self.stdout.write(
+                        f"{label}: p50={result['p50']:.2f}ms "
+                        f"p95={result['p95']:.2f}ms "
+                        f"p99={result['p99']:.2f}ms "
+                        f"opened={counters['opened']} "
+                        f"reused={counters['reused']} "
+                        f"failed={counters['failed']}"
+                    )
+        finally:
+            wrapper.settings_dict['CONN_MAX_AGE'] = max_age
+            wrapper.close()
+
+    @staticmethod
+    def _request(client: Client, url: str) -> None:
+        """Один запрос с закрытием соединений, как в обработчике WSGI.
+
+        Тестовый клиент сам отключает close_old_connections,
+        поэтому сигналы начала и конца запроса повторяются вручную.
+        """
+        close_old_connections()
+        response = client.get(url)
+        close_old_connections()
+        if response.status_code != 200:
+            raise CommandError(f'{url} ответил {response.status_code}')
+
+    @staticmethod
+    def _delta(before: Dict, after: Dict) -> Dict[str, int]:
+        return {
+            name: after[name] - before[name]
+            for name in ('opened', 'reused', 'failed')
+        }
@@ -0,0 +1,67 @@
+import csv
+import random
+from pathlib import Path
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.filters import IngredientFilter
+from api.ingredient_index import ingredient_index
+from api.serializers import IngredientReadSerializer
+from recipes.management.benchmark import measure
+from recipes.models import Ingredient
+
+
+def orm_search(query: str) -> List[Dict]:
+    """Прежний путь: фильтр startswith по базе и сериализация."""
+    queryset = IngredientFilter(
+        {'name': query}, queryset=Ingredient.objects.all()
+    ).qs
+    return IngredientReadSerializer(queryset, many=True).data
+
+
+class Command(BaseCommand):
+    help = ('Сравнение задержки поиска ингредиентов через ORM '
+            'и через индекс в памяти')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queries', type=int, default=500,
+            help='Количество поисковых запросов'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if not Ingredient.objects.exists():
+                self._load_catalog()
+            ingredient_index.build()
+            names = list(Ingredient.objects.values_list('name', flat=True))
+            generator = random.Random(options['seed'])
+            # Как при наборе текста: первые 1-4 символа названия.
+            queries = [
+                name[:generator.randint(1, 4)]
+                for name in generator.choices(names, k=options['queries'])
+            ]
+            for label, func in (
+                    ('orm', orm_search),
+                    ('index', ingredient_index.search),
+            ):
+                iterator = iter(queries)
+                result = measure(lambda: func(next(iterator)), len(queries))
+                self.stdout.write(
+                    f"{label}: queries={result['queries']} "
+                    f"p50={result['p50']:.3f}ms p95={result['p95']:.3f}ms "
+                    f"p99={result['p99']:.3f}ms"
+                )
+            transaction.set_rollback(True)
+
+    def _load_catalog(self) -> None:
+        """Загружает каталог из data/ingredients.csv на время замера."""
+        path = Path(settings.BASE_DIR) / 'data' / 'ingredients.csv'
+        with open(path, encoding='utf-8') as file:
+            Ingredient.objects.bulk_create(
+                Ingredient(**row) for row in csv.DictReader(file)
+            )
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.management.benchmark import percentiles
+from recipes.models import Recipe
+
+Response = Tuple[int, bool]
+
+
+class LoadStats:
+    """Задержки и статусы ответов за весь замер."""
+
+    def __init__(self) -> None:
+        self.timings: List[float] = []
+        self.statuses: Counter = Counter()
+        self.errors = 0
+
+
+async def read_response(reader: asyncio.StreamReader) -> Response:
+    """Читает ответ HTTP/1.1 и возвращает статус и признак того,
+    что сервер закрывает соединение."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Сервер закрыл соединение')
+    status = int(status_line.split()[1])
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection') == 'close'
+
+
+async def run_connection(
+        url: str,
+        paths: List[str],
+        offset: int,
+        deadline: float,
+        headers: str,
+        stats: LoadStats
+) -> None:
+    """Одно соединение: запросы по кругу до конца замера.
+
+    Если сервер не держит keep-alive, соединение открывается заново,
+    и время подключения входит в задержку запроса.
+    """
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    reader: Optional[asyncio.StreamReader] = None
+    writer: Optional[asyncio.StreamWriter] = None
+    number = offset
+    while time.perf_counter() < deadline:
+        path = paths[number % len(paths)]
+        number += 1
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(
+                f'GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n'
+                f'{headers}\r\n'.encode()
+            )
+            status, close = await read_response(reader)
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            stats.errors += 1
+            close = True
+        else:
+            stats.timings.append((time.perf_counter() - started) * 1000)
+            stats.statuses[status] += 1
+        if close and writer is not None:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный замер запущенного сервера: пропускная '
+            'способность и задержки при заданном числе соединений')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default='http://127.0.0.1:9000',
+            help='Адрес сервера'
+        )
+        parser.add_argument(
+            '--paths', nargs='+',
+            help='Пути для запросов, по умолчанию список и рецепт, '
+                 'теги и ингредиенты'
+        )
+        parser.add_argument(
+            '--connections', type=int, default=200,
+            help='Количество одновременных соединений'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность замера в секундах'
+        )
+        parser.add_argument(
+            '--token', help='Токен пользователя для заголовка Authorization'
+        )
+        parser.add_argument(
+            '--output', help='Файл, в который пишутся результаты в JSON'
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self._default_paths()
+        headers = 'Connection: keep-alive\r\n'
+        if options['token']:
+            headers += f"Authorization: Token {options['token']}\r\n"
+        stats = LoadStats()
+        started = time.perf_counter()
+        asyncio.run(self._run(options, paths, headers, stats))
+        elapsed = time.perf_counter() - started
+        if not stats.timings:
+            raise CommandError('Сервер не ответил ни на один запрос')
+        report = {
+            'url': options['url'],
+            'paths': paths,
+            'connections': options['connections'],
+            'duration': round(elapsed, 2),
+            'requests': len(stats.timings),
+            'rps': round(len(stats.timings) / elapsed, 1),
+            'errors': stats.errors,
+            'statuses': dict(stats.statuses),
+            **percentiles(stats.timings),
+        }
+        self.stdout.write(
+            f"connections={report['connections']} rps={report['rps']} "
+            f"p50={report['p50']:.1f}ms p95={report['p95']:.1f}ms "
+            f"p99={report['p99']:.1f}ms errors={report['errors']} "
+            f"statuses={report['statuses']}"
+        )
+        if options['output']:
+            Path(options['output']).write_text(
+                json.dumps(report, indent=2, ensure_ascii=False)
+            )
+
+    @staticmethod
+    async def _run(
+            options: Dict,
+            paths: List[str],
+            headers: str,
+            stats: LoadStats
+    ) -> None:
+        deadline = time.perf_counter() + options['duration']
+        await asyncio.gather(*(
+            run_connection(
+                options['url'], paths, number, deadline, headers, stats
+            )
+            for number in range(options['connections'])
+        ))
+
+    @staticmethod
+    def _default_paths() -> List[str]:
+        paths = ['/api/recipes/', '/api/tags/', '/api/ingredients/']
+        recipe_id = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first()
+        if recipe_id is not None:
+            paths.append(f'/api/recipes/{recipe_id}/')
+        return paths
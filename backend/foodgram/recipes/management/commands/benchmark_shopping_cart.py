@@ -0,0 +1,108 @@
+from collections import defaultdict
+from typing import Dict, List
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.shopping_list import get_shopping_list
+from recipes.management.benchmark import measure
+from recipes.models import Ingredient, Recipe, RecipeIngredient, ShoppingCart
+from users.models import User
+
+
+def legacy_shopping_list(user: User) -> List[Dict]:
+    """Прежний алгоритм: цикл по строкам корзины и суммирование в Python."""
+    ingredient_totals: Dict[str, int] = defaultdict(int)
+    for recipe_ingredient in RecipeIngredient.objects.filter(
+            recipe__shopping_carts__user=user
+    ):
+        ingredient_totals[recipe_ingredient.ingredient.name] += (
+            recipe_ingredient.amount
+        )
+    ingredient_units = {
+        ingredient.name: ingredient.measurement_unit
+        for ingredient in Ingredient.objects.filter(
+            name__in=list(ingredient_totals)
+        )
+    }
+    return [
+        {'name': name, 'unit': ingredient_units[name], 'amount': amount}
+        for name, amount in ingredient_totals.items()
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Сравнение прежней и новой выборки списка покупок '
+            'на корзинах разного размера')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[100, 1000],
+            help='Количество рецептов в корзине'
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='Количество ингредиентов в каждом рецепте'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Количество повторов каждого замера'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for size in options['sizes']:
+                user = self._fill_cart(
+                    size, options['ingredients_per_recipe']
+                )
+                for label, func in (
+                        ('legacy', legacy_shopping_list),
+                        ('group_by', lambda u: list(get_shopping_list(u))),
+                ):
+                    result = measure(lambda: func(user), options['repeat'])
+                    self.stdout.write(
+                        f"recipes={size} {label}: "
+                        f"queries={result['queries']} "
+                        f"median={result['p50']:.2f}ms"
+                    )
+            transaction.set_rollback(True)
+
+    def _fill_cart(self, size: int, ingredients_per_recipe: int) -> User:
+        """Создает пользователя с корзиной из size рецептов."""
+        user = User.objects.create(
+            username=f'benchmark_cart_{size}',
+            email=f'benchmark_cart_{size}@example.com',
+        )
+        prefix = f'benchmark {size} '
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'{prefix}{i}', measurement_unit='г')
+            for i in range(ingredients_per_recipe * 4)
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=user,
+                name=f'benchmark {i}',
+                text='benchmark',
+                cooking_time=1,
+                image='recipes/images/temp.png',
+            )
+            for i in range(size)
+        )
+        # SQLite не возвращает первичные ключи из bulk_create.
+        ingredients = list(Ingredient.objects.filter(name__startswith=prefix))
+        recipes = list(Recipe.objects.filter(author=user))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[
+                    (number + shift) % len(ingredients)
+                ],
+                amount=shift + 1,
+            )
+            for number, recipe in enumerate(recipes)
+            for shift in range(ingredients_per_recipe)
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe) for recipe in recipes
+        )
+        return user
@@ -1,19 +1,112 @@
 import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+from typing import IO, Dict, Iterator
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from api import constants
+from api.reference_cache import bump_version
 from recipes.models import Ingredient
 
+DEFAULT_PATH = Path(settings.BASE_DIR) / 'data' / 'ingredients.csv'
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def iter_csv(file: IO[str]) -> Iterator[Dict]:
+    """Построчно читает CSV с колонками name и measurement_unit."""
+    yield from csv.DictReader(file)
+
+
+def iter_json(file: IO[str]) -> Iterator[Dict]:
+    """Потоково читает JSON-массив объектов, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(JSON_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('JSON-файл должен содержать массив объектов.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            row, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Некорректный JSON-файл.')
+            buffer += chunk
+            continue
+        yield row
+        buffer = buffer[end:]
+
+
+READERS = {'csv': iter_csv, 'json': iter_json}
+
 
 class Command(BaseCommand):
     help = 'Импорт данных в таблицу Ингредиентов'
 
-    def handle(self, *args, **kwargs):
-        for row in csv.DictReader(
-                open('data/ingredients.csv', encoding='utf-8')
-        ):
-            ingredient = Ingredient(
-                name=row['name'],
-                measurement_unit=row['measurement_unit']
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=str(DEFAULT_PATH),
+            help='Путь к файлу с ингредиентами (CSV или JSON)'
+        )
+        parser.add_argument(
+            '--format', choices=tuple(READERS),
+            help='Формат файла, по умолчанию берется из расширения'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном INSERT'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path.name}')
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        read = 0
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            existing = Ingredient.objects.count()
+            rows = (
+                self._build(row, number)
+                for number, row in enumerate(READERS[file_format](file), 1)
+            )
+            while batch := list(islice(rows, batch_size)):
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                read += len(batch)
+                self.stdout.write(
+                    f'Обработано строк: {read} '
+                    f'({self._rate(read, started):.0f} строк/с)'
+                )
+            created = Ingredient.objects.count() - existing
+            # bulk_create не шлет сигналы, кэш ответов сбрасывается явно.
+            transaction.on_commit(
+                lambda: bump_version(constants.REFERENCE_INGREDIENTS)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: прочитано {read}, добавлено {created}, '
+            f'пропущено дублей {read - created} '
+            f'за {time.perf_counter() - started:.2f} с '
+            f'({self._rate(read, started):.0f} строк/с)'
+        ))
+
+    def _build(self, row: Dict, number: int) -> Ingredient:
+        try:
+            return Ingredient(
+                name=row['name'].strip(),
+                measurement_unit=row['measurement_unit'].strip(),
             )
-            ingredient.save()
+        except (KeyError, AttributeError, TypeError):
+            raise CommandError(f'Некорректная запись №{number}: {row}')
+
+    @staticmethod
+    def _rate(rows: int, started: float) -> float:
+        return rows / max(time.perf_counter() - started, 1e-9)
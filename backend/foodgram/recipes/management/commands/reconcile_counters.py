@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import constants
+from api.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Сверка счетчиков избранного, рецептов и подписок '
+            'с фактическими данными')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=constants.COUNTERS_BATCH_SIZE,
+            help='Количество строк в одном UPDATE'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        fixed = reconcile_counters(options['batch_size'])
+        for name, count in fixed.items():
+            self.stdout.write(f'{name}: исправлено {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.2f} с'
+        ))
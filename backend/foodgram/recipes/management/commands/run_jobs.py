@@ -0,0 +1,114 @@
+import multiprocessing
+import signal
+import time
+from multiprocessing.pool import AsyncResult, Pool
+from threading import Event
+from typing import List, Optional
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from api import constants
+from api.jobs import claim_jobs, purge_jobs, run_job
+
+
+def execute(job_id: int) -> str:
+    """Выполняет задачу в процессе пула, не держа битое соединение."""
+    close_old_connections()
+    try:
+        return run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def init_worker() -> None:
+    # Ctrl+C обрабатывает родитель: дожидается начатых задач.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди в базе: рендер PDF '
+            'списков покупок, обработка картинок рецептов, пересборка '
+            'поисковых документов, заполнение лент')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=2,
+            help='Количество процессов, 1 - выполнять задачи в этом процессе'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить задачи, которые уже в очереди, и выйти'
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        self.finished = Event()
+        processes = max(options['processes'], 1)
+        if processes == 1:
+            self._install_signals()
+            self._loop(None, 1, options)
+            return
+        # Дочерние процессы не должны делить соединение родителя.
+        connections.close_all()
+        pool = multiprocessing.Pool(processes, init_worker)
+        self._install_signals()
+        try:
+            self._loop(pool, processes, options)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _install_signals(self) -> None:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self._stop)
+
+    def _stop(self, signum, frame) -> None:
+        self.stdout.write('Остановка: дожидаемся начатых задач')
+        self.stopping = True
+
+    def _loop(
+            self,
+            pool: Optional[Pool],
+            processes: int,
+            options
+    ) -> None:
+        running: List[AsyncResult] = []
+        purged_at = 0.0
+        while not self.stopping:
+            self.finished.clear()
+            running = [result for result in running if not result.ready()]
+            free = processes - len(running)
+            job_ids = claim_jobs(free) if free else []
+            for job_id in job_ids:
+                if pool is None:
+                    self._report(job_id, execute(job_id))
+                else:
+                    running.append(pool.apply_async(
+                        execute, (job_id,),
+                        callback=lambda job_status, job_id=job_id: (
+                            self._report(job_id, job_status)
+                        ),
+                        error_callback=lambda error, job_id=job_id: (
+                            self._report(job_id, repr(error))
+                        ),
+                    ))
+            if job_ids:
+                continue
+            if time.monotonic() - purged_at > constants.JOB_PURGE_INTERVAL:
+                purge_jobs()
+                purged_at = time.monotonic()
+            if options['once'] and not running:
+                return
+            # Ждем освобождения процесса или новых задач в очереди.
+            self.finished.wait(options['poll_interval'])
+
+    def _report(self, job_id: int, job_status: str) -> None:
+        self.stdout.write(f'Задача {job_id}: {job_status}')
+        self.finished.set()
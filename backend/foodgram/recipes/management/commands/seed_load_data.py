@@ -0,0 +1,370 @@
+import multiprocessing
+import random
+import time
+from math import gcd
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+
+from api import constants
+from api.counters import reconcile_counters
+from api.feed import fill_feeds
+from api.reference_cache import bump_version
+from api.search import update_search_documents
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Subscribe, Tag)
+from users.models import User
+
+Task = Tuple[int, int, Dict]
+
+
+def skewed_index(rnd: random.Random, size: int, skew: float) -> int:
+    """Индекс от 0 до size - 1 по степенному закону: чем больше skew,
+    тем чаще выпадают первые индексы (популярные объекты)."""
+    return min(int(size * rnd.random() ** skew), size - 1)
+
+
+def popular(rnd: random.Random, first: int, size: int, skew: float) -> int:
+    """id популярного объекта из диапазона [first, first + size).
+
+    Ранг популярности переставляется по модулю size, чтобы самыми
+    популярными не оказывались просто самые старые записи.
+    """
+    rank = skewed_index(rnd, size, skew)
+    step = 7919 if gcd(7919, size) == 1 else 1
+    return first + rank * step % size
+
+
+def sample_unique(
+        rnd: random.Random,
+        count: int,
+        pick: Callable[[], int],
+        exclude: Iterable[int] = ()
+) -> Set[int]:
+    """До count разных значений pick(), не считая exclude."""
+    exclude = set(exclude)
+    result: Set[int] = set()
+    for _ in range(count * 4):
+        if len(result) == count:
+            break
+        value = pick()
+        if value not in exclude:
+            result.add(value)
+    return result
+
+
+def get_random(params: Dict, phase: str, start: int) -> random.Random:
+    """Генератор для куска данных: результат не зависит от того,
+    сколько процессов и в каком порядке обрабатывают куски."""
+    return random.Random(f"{params['seed']}:{phase}:{start}")
+
+
+def seed_users(task: Task) -> int:
+    start, count, params = task
+    User.objects.bulk_create(
+        (
+            User(
+                id=user_id,
+                username=f'load_{user_id}',
+                email=f'load_{user_id}@example.com',
+                first_name='Load',
+                last_name=str(user_id),
+                password=params['password'],
+            )
+            for user_id in range(start, start + count)
+        ),
+        batch_size=params['batch_size']
+    )
+    return count
+
+
+def seed_recipes(task: Task) -> int:
+    """Рецепты вместе с их тегами и ингредиентами."""
+    start, count, params = task
+    rnd = get_random(params, 'recipes', start)
+    skew = params['skew']
+    tag_ids = params['tag_ids']
+    ingredient_ids = params['ingredient_ids']
+    recipes, recipe_tags, recipe_ingredients = [], [], []
+    for recipe_id in range(start, start + count):
+        recipes.append(Recipe(
+            id=recipe_id,
+            author_id=popular(
+                rnd, params['user_first'], params['users'], skew
+            ),
+            name=f'Load recipe {recipe_id}',
+            text='Load test recipe. ' * rnd.randint(5, 40),
+            cooking_time=rnd.randint(5, 180),
+            image='recipes/images/temp.png',
+        ))
+        for tag_id in rnd.sample(tag_ids, rnd.randint(1, 3)):
+            recipe_tags.append(RecipeTag(recipe_id=recipe_id, tag_id=tag_id))
+        # В среднем ingredients_per_recipe, но не меньше одного.
+        low = min(3, params['ingredients_per_recipe'])
+        ingredients = sample_unique(
+            rnd,
+            rnd.randint(low, 2 * params['ingredients_per_recipe'] - low),
+            lambda: ingredient_ids[
+                skewed_index(rnd, len(ingredient_ids), skew)
+            ]
+        )
+        recipe_ingredients.extend(
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=rnd.randint(1, 500)
+            )
+            for ingredient_id in sorted(ingredients)
+        )
+    batch_size = params['batch_size']
+    with transaction.atomic():
+        Recipe.objects.bulk_create(recipes, batch_size=batch_size)
+        RecipeTag.objects.bulk_create(recipe_tags, batch_size=batch_size)
+        RecipeIngredient.objects.bulk_create(
+            recipe_ingredients, batch_size=batch_size
+        )
+        # bulk_create не шлет сигналы, документы строятся явно.
+        update_search_documents(range(start, start + count))
+    return len(recipes) + len(recipe_tags) + len(recipe_ingredients)
+
+
+def seed_relations(task: Task) -> int:
+    """Подписки, избранное и списки покупок пользователей."""
+    start, count, params = task
+    rnd = get_random(params, 'relations', start)
+    skew = params['skew']
+    subscriptions, favorites, carts = [], [], []
+
+    def pick_user() -> int:
+        return popular(rnd, params['user_first'], params['users'], skew)
+
+    def pick_recipe() -> int:
+        return popular(rnd, params['recipe_first'], params['recipes'], skew)
+
+    for user_id in range(start, start + count):
+        following = sample_unique(
+            rnd,
+            rnd.randint(0, 2 * params['subscriptions_per_user']),
+            pick_user,
+            exclude=(user_id,)
+        )
+        subscriptions.extend(
+            Subscribe(user_id=user_id, following_id=following_id)
+            for following_id in sorted(following)
+        )
+        favorites.extend(
+            Favorite(user_id=user_id, recipe_id=recipe_id)
+            for recipe_id in sorted(sample_unique(
+                rnd, rnd.randint(0, 2 * params['favorites_per_user']),
+                pick_recipe
+            ))
+        )
+        carts.extend(
+            ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+            for recipe_id in sorted(sample_unique(
+                rnd, rnd.randint(0, 2 * params['cart_per_user']),
+                pick_recipe
+            ))
+        )
+    batch_size = params['batch_size']
+    with transaction.atomic():
+        Subscribe.objects.bulk_create(subscriptions, batch_size=batch_size)
+        Favorite.objects.bulk_create(favorites, batch_size=batch_size)
+        ShoppingCart.objects.bulk_create(carts, batch_size=batch_size)
+    return len(subscriptions) + len(favorites) + len(carts)
+
+
+def seed_feeds(task: Task) -> int:
+    """Ленты пользователей по уже записанным подпискам."""
+    start, count, params = task
+    with transaction.atomic():
+        return fill_feeds(range(start, start + count))
+
+
+def init_worker() -> None:
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу синтетическими данными для нагрузочного '
+            'тестирования: пользователи, подписки, рецепты, избранное')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=10000,
+            help='Количество пользователей'
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=100000,
+            help='Количество рецептов'
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='Среднее количество ингредиентов в рецепте'
+        )
+        parser.add_argument(
+            '--subscriptions-per-user', type=int, default=5,
+            help='Среднее количество подписок пользователя'
+        )
+        parser.add_argument(
+            '--favorites-per-user', type=int, default=10,
+            help='Среднее количество избранных рецептов пользователя'
+        )
+        parser.add_argument(
+            '--cart-per-user', type=int, default=2,
+            help='Среднее количество рецептов в списке покупок'
+        )
+        parser.add_argument(
+            '--tags', type=int, default=10,
+            help='Сколько тегов должно быть в базе'
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Сколько ингредиентов создать, если их нет в базе'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=3.0,
+            help='Степень перекоса популярности авторов и рецептов'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество строк в одном INSERT'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Количество пользователей или рецептов в одной задаче'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=multiprocessing.cpu_count(),
+            help='Количество процессов, для SQLite всегда 1'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Зерно генератора данных'
+        )
+
+    def handle(self, *args, **options):
+        if options['ingredients_per_recipe'] < 1:
+            raise CommandError(
+                '--ingredients-per-recipe должно быть не меньше 1.'
+            )
+        started = time.perf_counter()
+        workers = options['workers']
+        if connection.vendor == 'sqlite':
+            workers = 1
+        params = self._prepare(options)
+        chunk = options['chunk_size']
+        for label, func, first, count in (
+                ('users', seed_users, params['user_first'], options['users']),
+                ('recipes', seed_recipes, params['recipe_first'],
+                 options['recipes']),
+                ('relations', seed_relations, params['user_first'],
+                 options['users']),
+                ('feeds', seed_feeds, params['user_first'], options['users']),
+        ):
+            tasks = [
+                (start, min(chunk, first + count - start), params)
+                for start in range(first, first + count, chunk)
+            ]
+            self._run(label, func, tasks, workers)
+        self._reset_sequences()
+        # bulk_create не шлет сигналы, счетчики пересчитываются разом.
+        fixed = reconcile_counters(options['batch_size'])
+        self.stdout.write(f'Счетчики пересчитаны: {fixed}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def _prepare(self, options: Dict) -> Dict:
+        """Создает недостающие теги и ингредиенты и резервирует
+        диапазоны id для новых пользователей и рецептов."""
+        existing_tags = Tag.objects.count()
+        if existing_tags < options['tags']:
+            Tag.objects.bulk_create(
+                Tag(name=f'Load {i}', slug=f'load-{i}', color='#49B64E')
+                for i in range(existing_tags, options['tags'])
+            )
+            bump_version(constants.REFERENCE_TAGS)
+        if not Ingredient.objects.exists():
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=f'load {i}', measurement_unit='г')
+                    for i in range(options['ingredients'])
+                ),
+                batch_size=options['batch_size']
+            )
+            bump_version(constants.REFERENCE_INGREDIENTS)
+        ingredient_ids: List[int] = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        return {
+            'seed': options['seed'],
+            'skew': options['skew'],
+            'batch_size': options['batch_size'],
+            'users': options['users'],
+            'recipes': options['recipes'],
+            'ingredients_per_recipe': options['ingredients_per_recipe'],
+            'subscriptions_per_user': options['subscriptions_per_user'],
+            'favorites_per_user': options['favorites_per_user'],
+            'cart_per_user': options['cart_per_user'],
+            'user_first': (
+                User.objects.aggregate(last=Max('id'))['last'] or 0
+            ) + 1,
+            'recipe_first': (
+                Recipe.objects.aggregate(last=Max('id'))['last'] or 0
+            ) + 1,
+            'tag_ids': list(Tag.objects.values_list('id', flat=True)),
+            'ingredient_ids': ingredient_ids,
+            # Один хэш на всех: хэширование каждого пароля заняло бы часы.
+            'password': make_password('load-test-password'),
+        }
+
+    def _run(
+            self,
+            label: str,
+            func: Callable[[Task], int],
+            tasks: List[Task],
+            workers: int
+    ) -> None:
+        started = time.perf_counter()
+        rows = 0
+        if workers > 1:
+            # Дочерние процессы не должны делить соединение родителя.
+            connections.close_all()
+            with multiprocessing.Pool(workers, init_worker) as pool:
+                results = pool.imap_unordered(func, tasks)
+                for done, task_rows in enumerate(results, 1):
+                    rows += task_rows
+                    self._progress(label, done, len(tasks), rows, started)
+        else:
+            for done, task in enumerate(tasks, 1):
+                rows += func(task)
+                self._progress(label, done, len(tasks), rows, started)
+
+    def _progress(
+            self,
+            label: str,
+            done: int,
+            total: int,
+            rows: int,
+            started: float
+    ) -> None:
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(
+            f'{label}: задач {done}/{total}, строк {rows} '
+            f'({rows / elapsed:.0f} строк/с)'
+        )
+
+    def _reset_sequences(self) -> None:
+        """Сдвигает последовательности id после вставки с явными id."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe]
+        )
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -0,0 +1,58 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Делает промежуточную таблицу тегов рецепта явной моделью.
+
+    Таблица recipes_recipe_tags уже существует, поэтому модель
+    и поле tags сначала меняются только в состоянии миграций,
+    а индексы и ограничения затем приводятся к описанным в модели.
+    """
+
+    dependencies = [
+        ('recipes', '0009_ingredient_unique'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='RecipeTag',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.recipe', verbose_name='Рецепт')),
+                        ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.tag', verbose_name='Тег')),
+                    ],
+                    options={
+                        'verbose_name': 'Тег рецепта',
+                        'verbose_name_plural': 'Теги рецептов',
+                        'db_table': 'recipes_recipe_tags',
+                        'unique_together': {('recipe', 'tag')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='recipe',
+                    name='tags',
+                    field=models.ManyToManyField(related_name='recipes', through='recipes.RecipeTag', to='recipes.Tag', verbose_name='Тег рецепта'),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipetag',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recipetag',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='recipetag',
+            constraint=models.UniqueConstraint(fields=('recipe', 'tag'), name='unique_recipe_tag'),
+        ),
+        migrations.AddIndex(
+            model_name='recipetag',
+            index=models.Index(fields=['tag', 'recipe'], name='recipe_tag_idx'),
+        ),
+    ]
@@ -0,0 +1,118 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+POSTGRESQL_CREATE = (
+    'ALTER TABLE recipes_recipesearch ADD COLUMN vector tsvector',
+    """
+    CREATE FUNCTION recipes_recipesearch_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.vector :=
+            setweight(to_tsvector('russian', NEW.name), 'A') ||
+            setweight(to_tsvector('russian', NEW.ingredients), 'B') ||
+            setweight(to_tsvector('russian', NEW.text), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER recipes_recipesearch_vector_trigger
+    BEFORE INSERT OR UPDATE ON recipes_recipesearch
+    FOR EACH ROW EXECUTE PROCEDURE recipes_recipesearch_vector()
+    """,
+    'CREATE INDEX recipe_search_vector_idx '
+    'ON recipes_recipesearch USING gin (vector)',
+)
+POSTGRESQL_DROP = (
+    'DROP FUNCTION IF EXISTS recipes_recipesearch_vector() CASCADE',
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'ALTER TABLE recipes_recipesearch DROP COLUMN IF EXISTS vector',
+)
+SQLITE_CREATE = (
+    """
+    CREATE VIRTUAL TABLE recipes_recipesearch_fts USING fts5(
+        name, ingredients, text,
+        content='recipes_recipesearch', content_rowid='recipe_id'
+    )
+    """,
+    """
+    CREATE TRIGGER recipes_recipesearch_fts_insert
+    AFTER INSERT ON recipes_recipesearch BEGIN
+        INSERT INTO recipes_recipesearch_fts(rowid, name, ingredients, text)
+        VALUES (new.recipe_id, new.name, new.ingredients, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipesearch_fts_delete
+    AFTER DELETE ON recipes_recipesearch BEGIN
+        INSERT INTO recipes_recipesearch_fts(
+            recipes_recipesearch_fts, rowid, name, ingredients, text
+        )
+        VALUES ('delete', old.recipe_id, old.name, old.ingredients, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipesearch_fts_update
+    AFTER UPDATE ON recipes_recipesearch BEGIN
+        INSERT INTO recipes_recipesearch_fts(
+            recipes_recipesearch_fts, rowid, name, ingredients, text
+        )
+        VALUES ('delete', old.recipe_id, old.name, old.ingredients, old.text);
+        INSERT INTO recipes_recipesearch_fts(rowid, name, ingredients, text)
+        VALUES (new.recipe_id, new.name, new.ingredients, new.text);
+    END
+    """,
+)
+SQLITE_DROP = (
+    'DROP TRIGGER IF EXISTS recipes_recipesearch_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipesearch_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipesearch_fts_update',
+    'DROP TABLE IF EXISTS recipes_recipesearch_fts',
+)
+STATEMENTS = {
+    'postgresql': (POSTGRESQL_CREATE, POSTGRESQL_DROP),
+    'sqlite': (SQLITE_CREATE, SQLITE_DROP),
+}
+
+
+def run_statements(schema_editor, position):
+    """Выполняет DDL поискового индекса для текущей базы.
+
+    На других базах индекс не создается, поиск работает без него.
+    """
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for statement in statements[position]:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    run_statements(schema_editor, 0)
+
+
+def drop_search_index(apps, schema_editor):
+    run_statements(schema_editor, 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearch',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('name', models.TextField(verbose_name='Название рецепта')),
+                ('ingredients', models.TextField(verbose_name='Ингредиенты')),
+                ('text', models.TextField(verbose_name='Описание рецепта')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ рецепта',
+                'verbose_name_plural': 'Поисковые документы рецептов',
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def fill_recipe_search(apps, schema_editor):
+    """Строит поисковые документы для уже существующих рецептов."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    RecipeSearch = apps.get_model('recipes', 'RecipeSearch')
+    recipes = Recipe.objects.order_by('id').values_list('id', 'name', 'text')
+    last_id = 0
+    while True:
+        batch = list(recipes.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            return
+        last_id = batch[-1][0]
+        ingredients = {}
+        for recipe_id, name in RecipeIngredient.objects.filter(
+                recipe_id__in=[row[0] for row in batch]
+        ).order_by('ingredient__name').values_list(
+            'recipe_id', 'ingredient__name'
+        ):
+            ingredients.setdefault(recipe_id, []).append(name)
+        RecipeSearch.objects.bulk_create(
+            RecipeSearch(
+                recipe_id=recipe_id,
+                name=name,
+                ingredients=' '.join(ingredients.get(recipe_id, ())),
+                text=text,
+            )
+            for recipe_id, name, text in batch
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipesearch'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_recipe_search, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+
+BACKFILL_LIMIT = 100
+BATCH_SIZE = 1000
+
+
+def fill_feed_entries(apps, schema_editor):
+    """Раскладывает последние рецепты авторов по лентам подписчиков.
+
+    Авторы с большим числом подписчиков пропускаются: их рецепты
+    лента дочитывает из таблицы рецептов.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Subscribe = apps.get_model('recipes', 'Subscribe')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    authors = Subscribe.objects.order_by().values('following').annotate(
+        followers=Count('id')
+    ).filter(
+        followers__lte=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values_list('following', flat=True)
+    for author_id in authors.iterator():
+        recipes = list(
+            Recipe.objects.filter(author_id=author_id).order_by(
+                '-pub_date', '-id'
+            ).values_list('id', 'pub_date')[:BACKFILL_LIMIT]
+        )
+        if not recipes:
+            continue
+        FeedEntry.objects.bulk_create(
+            (
+                FeedEntry(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for user_id in Subscribe.objects.filter(
+                    following_id=author_id
+                ).values_list('user_id', flat=True)
+                for recipe_id, pub_date in recipes
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_feedentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_feed_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes', 'Recipe', 'favorites_count', 'Favorite', 'recipe'),
+    ('users', 'User', 'recipes_count', 'Recipe', 'author'),
+    ('users', 'User', 'followers_count', 'Subscribe', 'following'),
+    ('users', 'User', 'following_count', 'Subscribe', 'user'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счетчики одним UPDATE с подзапросом на каждый."""
+    for app_label, model_name, field, source_name, relation in COUNTERS:
+        model = apps.get_model(app_label, model_name)
+        source = apps.get_model('recipes', source_name)
+        model.objects.update(**{field: Coalesce(
+            Subquery(
+                source.objects.filter(
+                    **{relation: OuterRef('pk')}
+                ).order_by().values(relation).annotate(
+                    total=Count('pk')
+                ).values('total')
+            ),
+            0
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipe_favorites_count'),
+        ('users', '0004_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2 on 2026-10-18 19:57
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_versions(apps, schema_editor):
+    ReferenceVersion = apps.get_model('recipes', 'ReferenceVersion')
+    ReferenceVersion.objects.bulk_create(
+        ReferenceVersion(name=name, updated=timezone.now())
+        for name in ('tags', 'ingredients')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_recipe_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Справочник')),
+                ('updated', models.DateTimeField(verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Версия справочника',
+                'verbose_name_plural': 'Версии справочников',
+            },
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
+from django.utils import timezone
 
-from users.models import User
+from api import constants
+from users.models import CounterFieldsMixin, User
 from users.validators import validate_number
 
 
@@ -33,6 +35,12 @@ class Ingredient(models.Model):
     )
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
@@ -41,8 +49,9 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     """Модель рецептов."""
+    counter_fields = constants.RECIPE_COUNTER_FIELDS
     name = models.CharField(
         verbose_name='Название рецепта',
         max_length=200,
@@ -68,6 +77,7 @@ class Recipe(models.Model):
     )
     tags = models.ManyToManyField(
         Tag,
+        through='RecipeTag',
         related_name='recipes',
         verbose_name='Тег рецепта',
     )
@@ -81,24 +91,41 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True,
     )
+    updated = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
     image = models.ImageField(
         verbose_name='Картинка рецепта',
         upload_to='recipes/images/',
         null=False,
     )
-    is_favorited = models.BooleanField(
-        verbose_name='В избранном ',
-        default=False,
-    )
-    is_in_shopping_cart = models.BooleanField(
-        verbose_name='В списке товаров',
-        default=False,
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
     )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        # Для курсорной пагинации ленты по (-pub_date, id).
+        indexes = [
+            models.Index(
+                fields=['-pub_date', 'id'], name='recipe_pub_date_id_idx'
+            ),
+            # Для ленты: последние рецепты автора одним диапазоном.
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            # Для сортировки по популярности с курсорной пагинацией.
+            models.Index(
+                fields=['-favorites_count', 'id'],
+                name='recipe_favorites_count_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -131,6 +158,120 @@ class RecipeIngredient(models.Model):
         return f'{self.ingredient} - {self.amount}'
 
 
+class RecipeTag(models.Model):
+    """Модель, связывающая рецепты и теги."""
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE
+    )
+    tag = models.ForeignKey(
+        Tag,
+        verbose_name='Тег',
+        on_delete=models.CASCADE
+    )
+
+    class Meta:
+        db_table = 'recipes_recipe_tags'
+        verbose_name = 'Тег рецепта'
+        verbose_name_plural = 'Теги рецептов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'tag'],
+                name='unique_recipe_tag'
+            )
+        ]
+        # Для фильтра по тегам: все рецепты тега без чтения таблицы.
+        indexes = [
+            models.Index(fields=['tag', 'recipe'], name='recipe_tag_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} - {self.tag}'
+
+
+class RecipeSearch(models.Model):
+    """Поисковый документ рецепта: название, ингредиенты и описание.
+
+    Индекс по документу строится средствами базы: в PostgreSQL это
+    колонка tsvector с GIN-индексом, в SQLite - таблица FTS5.
+    Обе обновляются триггерами при записи документа.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        related_name='search_document',
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE
+    )
+    name = models.TextField(verbose_name='Название рецепта')
+    ingredients = models.TextField(verbose_name='Ингредиенты')
+    text = models.TextField(verbose_name='Описание рецепта')
+
+    class Meta:
+        verbose_name = 'Поисковый документ рецепта'
+        verbose_name_plural = 'Поисковые документы рецептов'
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class Favorite(models.Model):
+    """Модель избранных рецептов пользователя."""
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        related_name='favorites',
+        on_delete=models.CASCADE
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='favorites',
+        on_delete=models.CASCADE
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_favorite'
+            )
+        ]
+        verbose_name = 'Избранное'
+        verbose_name_plural = 'Избранное'
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
+
+
+class ShoppingCart(models.Model):
+    """Модель списка покупок пользователя."""
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        related_name='shopping_carts',
+        on_delete=models.CASCADE
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='shopping_carts',
+        on_delete=models.CASCADE
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_shopping_cart'
+            )
+        ]
+        verbose_name = 'Список покупок'
+        verbose_name_plural = 'Списки покупок'
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
+
+
 class Subscribe(models.Model):
     """Модель подписок."""
     user = models.ForeignKey(
@@ -161,4 +302,149 @@ class Subscribe(models.Model):
         ordering = ('user__username',)
 
     def __str__(self):
-        return self.user
+        return f'{self.user} - {self.following}'
+
+
+class FeedEntry(models.Model):
+    """Запись ленты: рецепт автора, на которого подписан пользователь.
+
+    Записи раскладываются по лентам подписчиков при публикации рецепта
+    и добавляются или удаляются при подписке и отписке. Дата
+    публикации копируется из рецепта, чтобы страница ленты читалась
+    одним проходом по индексу (user, -pub_date, -recipe).
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='Владелец ленты',
+        related_name='feed_entries',
+        on_delete=models.CASCADE
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='feed_entries',
+        on_delete=models.CASCADE
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор рецепта',
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'], name='feed_user_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
+
+
+class Job(models.Model):
+    """Фоновая задача из очереди в базе: рендер PDF, обработка картинок.
+
+    Задачи выполняет команда run_jobs. Упавшая задача возвращается
+    в очередь с растущей задержкой, пока не кончатся попытки. Файл
+    результата, если он есть, хранится в MEDIA_ROOT.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Готово'
+        FAILED = 'failed', 'Ошибка'
+
+    kind = models.CharField(max_length=50, verbose_name='Тип задачи')
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='Статус',
+    )
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        related_name='jobs',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+    )
+    payload = models.JSONField(
+        default=dict, blank=True, verbose_name='Параметры'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0, verbose_name='Попыток'
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=constants.JOB_MAX_ATTEMPTS, verbose_name='Максимум попыток'
+    )
+    run_after = models.DateTimeField(
+        default=timezone.now, verbose_name='Запустить не раньше'
+    )
+    locked_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Взята в работу'
+    )
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    result = models.FileField(
+        upload_to='jobs/', blank=True, verbose_name='Результат'
+    )
+    content_type = models.CharField(
+        max_length=100, blank=True, verbose_name='Тип результата'
+    )
+    filename = models.CharField(
+        max_length=255, blank=True, verbose_name='Имя файла результата'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True, verbose_name='Создана'
+    )
+    updated = models.DateTimeField(auto_now=True, verbose_name='Обновлена')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ('-id',)
+        indexes = [
+            # Для выборки очереди воркером.
+            models.Index(
+                fields=['status', 'run_after'], name='job_status_run_after_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
+
+
+class ReferenceVersion(models.Model):
+    """Версия справочника тегов или ингредиентов - время его
+    последнего изменения.
+
+    Версия хранится в базе, поэтому изменение справочника в любом
+    процессе, включая management-команды, сразу меняет ETag и ключи
+    кэша во всех воркерах.
+    """
+    name = models.CharField(
+        max_length=50, primary_key=True, verbose_name='Справочник'
+    )
+    updated = models.DateTimeField(verbose_name='Дата изменения')
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return f'{self.name} ({self.updated})'
@@ -1,3 +1,5 @@
+from typing import FrozenSet
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
@@ -7,8 +9,28 @@ from users.validators import (validate_email_length,
                               validate_username, validate_username_length)
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """Не дает обычному save() перезаписать счетчики.
+
+    Счетчики меняются только запросами UPDATE с F()-выражениями,
+    а сохранение объекта, прочитанного раньше такого UPDATE,
+    записало бы в них устаревшее значение.
+    """
+    counter_fields: FrozenSet[str] = frozenset()
+
+    def save(self, *args, **kwargs) -> None:
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     """Модель пользователя"""
+    counter_fields = constants.USER_COUNTER_FIELDS
     email = models.EmailField(
         verbose_name='email адрес',
         unique=True,
@@ -46,6 +68,21 @@ class User(AbstractUser):
         default=False,
         db_index=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        editable=False,
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Подписок',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
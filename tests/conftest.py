@@ -0,0 +1,64 @@
+import pytest
+from django.core.cache import caches
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+
+@pytest.fixture(autouse=True)
+def isolated(settings, tmp_path):
+    """Файлы пишутся во временный каталог, кэши не переживают тест."""
+    settings.MEDIA_ROOT = tmp_path
+    for cache in caches.all():
+        cache.clear()
+    yield
+    for cache in caches.all():
+        cache.clear()
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        username='user', email='user@example.com', password='password',
+        first_name='Имя', last_name='Фамилия'
+    )
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def tags():
+    return [
+        Tag.objects.create(name=f'Тег {i}', slug=f'tag{i}', color='#FFFFFF')
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def ingredients():
+    return [
+        Ingredient.objects.create(name=f'ингредиент {i}', measurement_unit='г')
+        for i in range(5)
+    ]
+
+
+@pytest.fixture
+def make_recipe(tags, ingredients):
+    def make_recipe(author: User, name: str = 'Рецепт') -> Recipe:
+        recipe = Recipe.objects.create(
+            author=author, name=name, text='Описание', cooking_time=10,
+            image='recipes/images/recipe.png'
+        )
+        recipe.tags.set(tags[:2])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=100)
+            for ingredient in ingredients[:3]
+        )
+        return recipe
+    return make_recipe
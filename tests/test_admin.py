@@ -0,0 +1,45 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Ingredient, RecipeIngredient
+
+
+@pytest.fixture
+def ingredient_rows(make_recipe, user):
+    """Рецепт с ingredient_count строками ингредиентов."""
+    def ingredient_rows(ingredient_count: int):
+        recipe = make_recipe(user)
+        recipe.recipe_ingredients.all().delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=Ingredient.objects.create(
+                    name=f'строка {recipe.id} {i}', measurement_unit='г'
+                ),
+                amount=100
+            )
+            for i in range(ingredient_count)
+        )
+        return recipe
+    return ingredient_rows
+
+
+def test_recipe_change_page_query_count_does_not_depend_on_rows(
+        admin_client, ingredient_rows, tags
+):
+    recipes = [ingredient_rows(1), ingredient_rows(8)]
+    recipes[0].tags.set(tags[:1])
+    recipes[1].tags.set(tags)
+    # Первый запрос кэширует ContentType и не сравним с остальными.
+    admin_client.get(f'/admin/recipes/recipe/{recipes[0].id}/change/')
+    counts = []
+    for recipe in recipes:
+        with CaptureQueriesContext(connection) as context:
+            response = admin_client.get(
+                f'/admin/recipes/recipe/{recipe.id}/change/'
+            )
+        assert response.status_code == 200
+        assert f'строка {recipe.id} 0' in response.content.decode()
+        counts.append(len(context.captured_queries))
+    assert counts[0] == counts[1]
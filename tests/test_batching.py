@@ -0,0 +1,18 @@
+import pytest
+from django.db import transaction
+
+from api.batching import OnCommitBatch
+
+
+@pytest.mark.django_db
+def test_rolled_back_ids_are_not_flushed(django_capture_on_commit_callbacks):
+    calls = []
+    batch = OnCommitBatch(calls.append)
+    with pytest.raises(ValueError), transaction.atomic():
+        batch.add([1, 2])
+        raise ValueError
+    with django_capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            batch.add([3])
+            batch.add([3, 4])
+    assert calls == [{3, 4}]
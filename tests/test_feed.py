@@ -0,0 +1,35 @@
+from api import constants
+from api.jobs import claim_jobs, run_job
+from recipes.models import FeedEntry, Job, Subscribe
+
+
+def test_unsubscribe_backfills_remaining_feeds_in_a_job(
+        settings, django_user_model, user, user_client, make_recipe
+):
+    settings.FEED_FANOUT_MAX_FOLLOWERS = 2
+    author = django_user_model.objects.create_user(
+        username='author', email='author@example.com', password='password'
+    )
+    recipe = make_recipe(author)
+    followers = [user] + [
+        django_user_model.objects.create_user(
+            username=f'follower{i}', email=f'follower{i}@example.com',
+            password='password'
+        )
+        for i in range(2)
+    ]
+    for follower in followers:
+        Subscribe.objects.create(user=follower, following=author)
+    FeedEntry.objects.all().delete()
+
+    response = user_client.delete(f'/api/users/{author.id}/subscribe/')
+
+    assert response.status_code == 204
+    assert not FeedEntry.objects.exists()
+    job = Job.objects.get()
+    assert job.kind == constants.JOB_FEED_BACKFILL
+    assert claim_jobs(1) == [job.id]
+    assert run_job(job.id) == Job.Status.DONE
+    assert set(FeedEntry.objects.values_list('user_id', 'recipe_id')) == {
+        (follower.id, recipe.id) for follower in followers[1:]
+    }
@@ -0,0 +1,84 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Subscribe
+
+AUTHORS = 6
+
+
+@pytest.fixture
+def authors(django_user_model, user, make_recipe):
+    """Авторы с рецептами, на первую половину user подписан."""
+    authors = [
+        django_user_model.objects.create_user(
+            username=f'author{i}', email=f'author{i}@example.com',
+            password='password', first_name='Автор', last_name=str(i)
+        )
+        for i in range(AUTHORS)
+    ]
+    for author in authors:
+        make_recipe(author, name=f'Рецепт {author.username}')
+    Subscribe.objects.bulk_create(
+        Subscribe(user=user, following=author)
+        for author in authors[:AUTHORS // 2]
+    )
+    return authors
+
+
+def test_recipe_list_query_count(
+        user_client, authors, django_assert_num_queries
+):
+    followed = {author.id for author in authors[:AUTHORS // 2]}
+    with django_assert_num_queries(6):
+        response = user_client.get('/api/recipes/')
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert len(results) == AUTHORS
+    for recipe in results:
+        assert recipe['author']['is_subscribed'] == (
+            recipe['author']['id'] in followed
+        )
+
+
+def test_recipe_detail_query_count(
+        user_client, authors, django_assert_num_queries
+):
+    for author, is_subscribed in ((authors[0], True), (authors[-1], False)):
+        recipe = author.recipes.get()
+        with django_assert_num_queries(5):
+            response = user_client.get(f'/api/recipes/{recipe.id}/')
+        assert response.status_code == 200
+        assert response.json()['author']['is_subscribed'] is is_subscribed
+
+
+def test_recipe_update_query_count_does_not_depend_on_tags(
+        user, user_client, make_recipe, tags, ingredients
+):
+    counts = []
+    for tag_list in (tags[:1], tags):
+        recipe = make_recipe(user)
+        recipe.tags.set(tag_list)
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.patch(f'/api/recipes/{recipe.id}/', {
+                'tags': [tag.id for tag in tag_list],
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': 100}
+                    for ingredient in ingredients[:3]
+                ],
+            }, format='json')
+        assert response.status_code == 200, response.json()
+        counts.append(len(context.captured_queries))
+    assert counts[0] == counts[1]
+
+
+def test_recipe_update_rejects_unknown_tag(
+        user, user_client, make_recipe, tags, ingredients
+):
+    recipe = make_recipe(user)
+    response = user_client.patch(f'/api/recipes/{recipe.id}/', {
+        'tags': [tags[0].id, 10 ** 6],
+        'ingredients': [{'id': ingredients[0].id, 'amount': 100}],
+    }, format='json')
+    assert response.status_code == 400
+    assert 'tags' in response.json()
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from api import constants
+from recipes.models import ReferenceVersion
+
+
+def test_version_change_from_another_process_changes_etag(user_client, tags):
+    etag = user_client.get('/api/tags/')['ETag']
+    response = user_client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    # Так версию сдвигает import_csv или другой воркер: только в базе.
+    ReferenceVersion.objects.filter(name=constants.REFERENCE_TAGS).update(
+        updated=timezone.now() + timedelta(seconds=1)
+    )
+    response = user_client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert len(response.json()) == len(tags)
@@ -0,0 +1,41 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import RecipeSearch
+
+
+def count_rebuilds(context: CaptureQueriesContext) -> int:
+    """Сколько раз пересобирались поисковые документы."""
+    table = RecipeSearch._meta.db_table
+    return sum(
+        query['sql'].startswith(f'DELETE FROM "{table}"')
+        for query in context.captured_queries
+    )
+
+
+def test_recipe_update_rebuilds_search_document_once(
+        user, user_client, make_recipe, tags, ingredients,
+        django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe = make_recipe(user)
+    payload = {
+        'name': 'Новое название',
+        'text': 'Новое описание',
+        'cooking_time': 15,
+        'tags': [tags[2].id],
+        'ingredients': [
+            {'id': ingredients[0].id, 'amount': 50},
+            {'id': ingredients[3].id, 'amount': 200},
+        ],
+    }
+    with CaptureQueriesContext(connection) as context:
+        with django_capture_on_commit_callbacks(execute=True):
+            response = user_client.patch(
+                f'/api/recipes/{recipe.id}/', payload, format='json'
+            )
+    assert response.status_code == 200, response.json()
+    assert count_rebuilds(context) == 1
+    document = RecipeSearch.objects.get(recipe=recipe)
+    assert document.name == 'Новое название'
+    assert document.ingredients == 'ингредиент 0 ингредиент 3'